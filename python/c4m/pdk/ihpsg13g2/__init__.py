@@ -1,41 +1,85 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
 from importlib import import_module
-from typing import Iterable, Any
+from typing import TYPE_CHECKING, Dict, Tuple, Iterable, Any
 
-from pdkmaster.design import library as _lbry
+from ._layers import *
+from ._layers import __all__ as _layers_all
 
-from c4m.flexcell import factory as _stdfab
 
-from .pdkmaster import *
-from .spice import *
-from .pyspice import *
-from .klayout import register_primlib as pya_register_primlib
+# This module uses lazy submodule importing using __getattr__() to avoid that the
+# technology is built and that all libraries are generated when this module is
+# imported; `import c4m.pdk.ihpsg13g2` only loads the GDS layer map.
+# The names are listed here so that the submodules don't need to be imported to
+# look them up.
+_lazy: Dict[str, Tuple[str, str]] = {
+    **{
+        name: (".pdkmaster", name) for name in (
+            "tech", "technology", "layoutfab", "layout_factory",
+            "cktfab", "circuit_factory",
+        )
+    },
+    "prims_spiceparams": (".spice", "prims_spiceparams"),
+    "netlistfab": (".spice", "netlistfab"),
+    "pyspicefab": (".pyspice", "pyspicefab"),
+    "flat_pyspicefab": (".pyspice", "flat_pyspicefab"),
+    "pya_register_primlib": (".klayout", "register_primlib"),
+    "configure_cache": ("._cache", "configure"),
+    "clear_cache": ("._cache", "clear"),
+    "configure_primcache": ("._primcache", "configure"),
+    "clear_primcache": ("._primcache", "clear"),
+    "primcache_stats": ("._primcache", "stats"),
+    "generate_libs": ("._parallel", "generate_libs"),
+    "prewarm": ("._parallel", "prewarm"),
+    "join_prewarm": ("._parallel", "join_prewarm"),
+    "stream_gds": (".gds", "stream_gds"),
+    "resistor_models": (".resistor", "resistor_models"),
+    **{
+        name: (".stdcell", name) for name in (
+            "stdcellcanvas", "StdCellFactory", "stdcelllib",
+            "stdcell3v3canvas", "StdCell3V3Factory", "stdcell3v3lib",
+        )
+    },
+    **{
+        name: (".io", name) for name in (
+            "ihpsg13g2_iospec", "ihpsg13g2_ioframespec", "IHPSG13g2IOFactory",
+            "ihpsg13g2_iofab", "iolib",
+        )
+    },
+}
+# `from c4m.pdk.ihpsg13g2 import *` does not generate the libraries
+__all__ = [
+    *_layers_all,
+    *(name for name, (modname, _) in _lazy.items() if modname not in (".stdcell", ".io")),
+]
 
+if TYPE_CHECKING:
+    from pdkmaster.design import library as _lbry
 
-# This module uses lazy submodule importing using __getattr__() to avoid that all
-# libraries are generated when this module is imported.
+    from .pdkmaster import *
+    from .spice import *
+    from .pyspice import *
+    from .klayout import register_primlib as pya_register_primlib
+    from ._cache import configure as configure_cache, clear as clear_cache
+    from ._primcache import (
+        configure as configure_primcache, clear as clear_primcache,
+        stats as primcache_stats,
+    )
+    from ._parallel import generate_libs, prewarm, join_prewarm
+    from .gds import stream_gds
+    from .resistor import resistor_models
+    from .stdcell import *
+    from .io import *
 
-
-from .pdkmaster import __all__ as _pdkmaster_all
-from .pyspice import __all__ as _pyspice_all
-from .stdcell import __all__ as _stdcell_all
-from .io import __all__ as _io_all
-
-stdcellcanvas: _stdfab.StdCellCanvas
-StdCellFactory: type
-stdcelllib: _lbry.RoutingGaugeLibrary
-stdcell3v3canvas: _stdfab.StdCellCanvas
-StdCell3V3Factory: type
-stdcell3v3lib: _lbry.RoutingGaugeLibrary
-libs: Iterable[_lbry.Library]
+    libs: Iterable[_lbry.Library]
 def __getattr__(name: str) -> Any:
-    if name in _stdcell_all:
-        stdcell = import_module(".stdcell", __name__)
-        return getattr(stdcell, name)
-    elif name in _io_all:
-        io = import_module(".io", __name__)
-        return getattr(io, name)
+    if name in _lazy:
+        modname, attr = _lazy[name]
+        value = globals()[name] = getattr(import_module(modname, __name__), attr)
+        return value
     elif name == "libs":
+        # Uses worker processes if C4M_IHPSG13G2_WORKERS is set
+        from ._parallel import generate_libs
+        generate_libs()
         from .stdcell import stdcelllib, stdcell3v3lib
         from .io import iolib
         return [stdcelllib, stdcell3v3lib, iolib]
@@ -47,8 +91,5 @@ def __dir__():
     self = import_module(__name__)
     return sorted((
         *(name for name in self.__dict__.keys() if name.startswith("__")),
-        *_pdkmaster_all, *_pyspice_all,
-        "pya_register_primlib",
-        *_stdcell_all, *_io_all,
-        "libs",
+        *_layers_all, *_lazy.keys(), "libs",
     ))
@@ -0,0 +1,381 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Benchmarks for the generation of the PDK data.
+
+Each benchmark is run in a fresh Python process with the library cache and the
+technology snapshot disabled and without worker processes so the results are not
+influenced by earlier runs. Time is measured for the benchmark itself. The peak
+memory is the maximum resident set size during the benchmark, which includes the
+memory still used by the setup, given as `setup_rss`; on Linux the peak is reset
+after the setup, on other platforms it is the peak of the whole process. A
+benchmark that fails is reported with its error and the other benchmarks are
+still run. Results are written as JSON together with the versions of the
+packages so results of different releases can be compared:
+
+    python -m c4m.pdk.ihpsg13g2._benchmark -o new.json
+    python -m c4m.pdk.ihpsg13g2._benchmark -o new.json --compare old.json
+
+Run with `--help` for the other options.
+"""
+import os, sys, json, time, platform, subprocess, tempfile
+from importlib import metadata as _md
+from typing import Callable, Dict, List, Optional, Any
+
+
+__all__ = ["benchmarks", "run", "compare"]
+
+
+class _Skip(Exception):
+    pass
+
+
+# Benchmark functions do the setup and return the function to time
+_BenchT = Callable[[], Callable[[], Any]]
+_benchmarks: Dict[str, _BenchT] = {}
+
+
+def _benchmark(name: str) -> Callable[[_BenchT], _BenchT]:
+    def register(f: _BenchT) -> _BenchT:
+        _benchmarks[name] = f
+        return f
+    return register
+
+
+def _complete(libname: str):
+    # Generate a library with circuit and layout of all cells
+    from . import _parallel, stdcell, io
+
+    _parallel.generate_libs(libname, workers=1)
+    lib = getattr(io if libname == "iolib" else stdcell, libname)
+    _parallel._generated(lib.cells)
+    return lib
+
+
+@_benchmark("import")
+def _bench_import():
+    # Import time is measured by the process running the benchmark
+    return lambda: None
+
+
+@_benchmark("tech")
+def _bench_tech():
+    def run():
+        from .pdkmaster import tech
+        tech.primitives
+    return run
+
+
+@_benchmark("tech:snapshot")
+def _bench_techsnapshot():
+    from . import _techsnapshot
+    from .pdkmaster import _IHPSG13G2
+
+    tmpdir = tempfile.TemporaryDirectory()
+    _techsnapshot.write(os.path.join(tmpdir.name, "tech.snapshot"))
+
+    def run():
+        os.environ["C4M_IHPSG13G2_TECHSNAPSHOT"] = os.path.join(tmpdir.name, "tech.snapshot")
+        assert _techsnapshot.load(cls=_IHPSG13G2) is not None
+    return run
+
+
+for _cellname in ("inv_x1", "nand2_x1", "dff_x1"):
+    def _bench_stdcell(name=_cellname):
+        from .stdcell import stdcelllib
+
+        def run():
+            cell = stdcelllib.cells[name]
+            cell.circuit
+            cell.layout
+        return run
+    _benchmark(f"cell:{_cellname}")(_bench_stdcell)
+
+for _cellname in ("IOPadIn", "IOPadOut16mA", "IOPadVdd"):
+    def _bench_iocell(name=_cellname):
+        from .io import ihpsg13g2_iofab
+
+        def run():
+            cell = ihpsg13g2_iofab.get_cell(name)
+            cell.circuit
+            cell.layout
+        return run
+    _benchmark(f"cell:{_cellname}")(_bench_iocell)
+
+for _libname in ("stdcelllib", "stdcell3v3lib", "iolib"):
+    def _bench_lib(name=_libname):
+        from .pdkmaster import tech
+        tech.primitives
+        return lambda: _complete(name)
+    _benchmark(f"lib:{_libname}")(_bench_lib)
+
+
+@_benchmark("klayout:primlib")
+def _bench_primlib():
+    try:
+        import pya
+    except ImportError:
+        raise _Skip("pya not available")
+    from .klayout import register_primlib
+    return lambda: register_primlib(name="C4M.Benchmark")
+
+
+for _libname in ("stdcelllib", "iolib"):
+    def _bench_gds(name=_libname):
+        try:
+            from pdkmaster.io.klayout import export2db
+        except ImportError:
+            raise _Skip("pya not available")
+        from ._layers import gds_layers, textgds_layers
+
+        lib = _complete(name)
+
+        def run():
+            layout = export2db(
+                lib, gds_layers=gds_layers, textgds_layers=textgds_layers,
+                add_pin_label=True,
+            )
+            with tempfile.TemporaryDirectory() as d:
+                layout.write(os.path.join(d, f"{name}.gds"))
+        return run
+    _benchmark(f"gds:{_libname}")(_bench_gds)
+
+
+@_benchmark("spice:netlist")
+def _bench_netlist():
+    from .spice import netlistfab
+
+    lib = _complete("stdcelllib")
+    return lambda: netlistfab.export_library(lib)
+
+
+@_benchmark("spice:testbench")
+def _bench_testbench():
+    try:
+        import PySpice
+    except ImportError:
+        raise _Skip("PySpice not available")
+    from .pyspice import pyspicefab
+    from .stdcell import stdcelllib
+
+    cell = stdcelllib.cells["inv_x1"]
+    cell.circuit
+
+    def run():
+        str(pyspicefab.new_pyspicecircuit(
+            corner=("lvmos_tt", "hvmos_tt", "res_typ", "dio"), top=cell.circuit,
+            title="benchmark",
+        ))
+    return run
+
+
+def benchmarks() -> List[str]:
+    "Names of the available benchmarks"
+    return list(_benchmarks.keys())
+
+
+def _status(field: str) -> Optional[int]:
+    # Field in KiB from the Linux process status
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _reset_maxrss() -> None:
+    # Reset the peak resident set size reported in the Linux process status
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _maxrss() -> Optional[int]:
+    # Peak resident set size in KiB
+    rss = _status("VmHWM")
+    if rss is not None:
+        return rss
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes
+    return rss//1024 if sys.platform == "darwin" else rss
+
+
+def _child(name: str, *, import_time: float) -> None:
+    # Run a benchmark and print the result as JSON
+    try:
+        f = _benchmarks[name]()
+    except _Skip as e:
+        print(json.dumps({"skipped": str(e)}))
+        return
+    setup_rss = _status("VmRSS")
+    _reset_maxrss()
+    if name == "import":
+        t = import_time
+    else:
+        t0 = time.perf_counter()
+        f()
+        t = time.perf_counter() - t0
+    print(json.dumps({"time": t, "maxrss": _maxrss(), "setup_rss": setup_rss}))
+
+
+# Code run in the benchmark process; the package import is timed first
+_childcode = """
+import sys, time
+t0 = time.perf_counter()
+import c4m.pdk.ihpsg13g2
+t = time.perf_counter() - t0
+from c4m.pdk.ihpsg13g2 import _benchmark
+_benchmark._child(sys.argv[1], import_time=t)
+"""
+
+
+def _run1(name: str) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env["C4M_IHPSG13G2_CACHEDIR"] = ""
+    env["C4M_IHPSG13G2_TECHSNAPSHOT"] = ""
+    env["C4M_IHPSG13G2_WORKERS"] = "1"
+    p = subprocess.run(
+        (sys.executable, "-c", _childcode, name),
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    lines = p.stdout.splitlines()
+    if (p.returncode != 0) or not lines:
+        # Last line of the traceback
+        errs = p.stderr.strip().splitlines()
+        return {"failed": errs[-1] if errs else f"exit code {p.returncode}"}
+    return json.loads(lines[-1])
+
+
+def run(names: Optional[List[str]]=None, *, repeat: int=3) -> Dict[str, Any]:
+    """Run benchmarks and return the results.
+
+    Arguments:
+        names: the benchmarks to run; all if not given
+        repeat: the number of runs of each benchmark; the minimum time and the
+            maximum peak memory are reported.
+    """
+    if names is None:
+        names = benchmarks()
+    for name in names:
+        if name not in _benchmarks:
+            raise ValueError(f"Unknown benchmark '{name}'")
+
+    versions: Dict[str, Optional[str]] = {}
+    for dist in ("c4m-pdk-ihpsg13g2", "PDKMaster", "c4m-flexcell", "c4m-flexio"):
+        try:
+            versions[dist] = _md.version(dist)
+        except _md.PackageNotFoundError:
+            versions[dist] = None
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in names:
+        rs: List[Dict[str, Any]] = []
+        for _ in range(repeat):
+            r = _run1(name)
+            if ("skipped" in r) or ("failed" in r):
+                rs = [r]
+                break
+            rs.append(r)
+        if ("skipped" in rs[0]) or ("failed" in rs[0]):
+            results[name] = rs[0]
+        else:
+            rsss = [r["maxrss"] for r in rs if r["maxrss"] is not None]
+            setups = [r["setup_rss"] for r in rs if r["setup_rss"] is not None]
+            results[name] = {
+                "time": min(r["time"] for r in rs),
+                "maxrss": max(rsss) if rsss else None,
+                "setup_rss": max(setups) if setups else None,
+            }
+
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": versions,
+        "results": results,
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], *, threshold: float=1.1) -> bool:
+    """Print a comparison of two benchmark results.
+
+    Returns False if one of the benchmarks got slower or used more memory by more
+    than the given factor, or failed.
+    """
+    ok = True
+    print(f"{'benchmark':<24} {'old [s]':>10} {'new [s]':>10} {'ratio':>7} {'mem ratio':>9}")
+    for name, r in new["results"].items():
+        if "failed" in r:
+            ok = False
+            print(f"{name:<24} failed: {r['failed']}")
+            continue
+        o = old["results"].get(name)
+        if o is None or "skipped" in o or "failed" in o or "skipped" in r:
+            continue
+        ratio = r["time"]/o["time"] if o["time"] > 0 else 1.0
+        memratio = (
+            r["maxrss"]/o["maxrss"] if (r["maxrss"] and o["maxrss"]) else 1.0
+        )
+        flag = ""
+        if (ratio > threshold) or (memratio > threshold):
+            ok = False
+            flag = " !"
+        print(
+            f"{name:<24} {o['time']:>10.3f} {r['time']:>10.3f}"
+            f" {ratio:>7.2f} {memratio:>9.2f}{flag}"
+        )
+    return ok
+
+
+def _main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m c4m.pdk.ihpsg13g2._benchmark",
+        description="Run the c4m-pdk-ihpsg13g2 benchmarks",
+    )
+    parser.add_argument("names", nargs="*", help="benchmarks to run; default all")
+    parser.add_argument("-l", "--list", action="store_true", help="list the benchmarks")
+    parser.add_argument("-o", "--output", help="JSON file to write the results to")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-c", "--compare", help="JSON file with results to compare with")
+    parser.add_argument(
+        "-t", "--threshold", type=float, default=1.1,
+        help="ratio above which a benchmark is reported as a regression",
+    )
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(benchmarks()))
+        return 0
+
+    results = run(args.names or None, repeat=args.repeat)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        return 0 if compare(old, results, threshold=args.threshold) else 1
+    else:
+        ok = True
+        for name, r in results["results"].items():
+            if "skipped" in r:
+                print(f"{name:<24} skipped: {r['skipped']}")
+            elif "failed" in r:
+                ok = False
+                print(f"{name:<24} failed: {r['failed']}")
+            else:
+                print(f"{name:<24} {r['time']:>10.3f} s {r['maxrss'] or 0:>10} KiB")
+        return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
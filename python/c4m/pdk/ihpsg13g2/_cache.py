@@ -0,0 +1,295 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Persistent on-disk cache for the generated libraries.
+For internal use only.
+
+Entries are content addressed; the key is computed from the source of the modules
+defining the technology and the cell factory parameters and from the versions of
+the packages used for generation. An entry with an outdated key is never hit; it is
+removed when a new entry for the same library is stored.
+
+The cache is disabled by default. It is enabled by setting the cache directory
+with the `C4M_IHPSG13G2_CACHEDIR` environment variable or with `configure()`;
+`configure(enable=True)` uses `c4m-pdk-ihpsg13g2` in the user cache directory
+(`$XDG_CACHE_HOME` or `~/.cache`). The entries are pickles of the cells, so the
+cache directory should only be writable by the user. The size limit can be set
+with the `C4M_IHPSG13G2_CACHELIMIT` environment variable (in MiB, default 1024)
+or with `configure()`.
+"""
+import os, sys, pickle, copyreg, hashlib, warnings
+from collections import abc as _abc
+from pathlib import Path
+from importlib import metadata as _md
+from typing import TYPE_CHECKING, Dict, Tuple, Iterable, Optional, Any
+
+if TYPE_CHECKING:
+    from pdkmaster.design import library as _lbry
+
+
+__all__ = ["configure", "clear"]
+
+
+_moddir = Path(__file__).parent
+# Packages that influence the generated cells
+_dists = ("PDKMaster", "c4m-flexcell", "c4m-flexio")
+_suffix = ".pickle"
+
+
+def _user_dir() -> Path:
+    xdg = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg) if xdg else Path.home().joinpath(".cache")
+    return base.joinpath("c4m-pdk-ihpsg13g2")
+
+
+def _env_dir() -> Optional[Path]:
+    s = os.environ.get("C4M_IHPSG13G2_CACHEDIR")
+    return Path(s) if s else None
+
+
+_dir: Optional[Path] = _env_dir()
+# In bytes; parsed from the environment when first needed
+_limit: Optional[int] = None
+
+
+def _get_limit() -> int:
+    global _limit
+    if _limit is None:
+        s = os.environ.get("C4M_IHPSG13G2_CACHELIMIT", "1024")
+        try:
+            _limit = int(s)*1024*1024
+        except ValueError:
+            warnings.warn(f"Invalid C4M_IHPSG13G2_CACHELIMIT '{s}'; using 1024 MiB")
+            _limit = 1024*1024*1024
+    return _limit
+
+
+def configure(*,
+    cachedir: Optional[str]=None, enable: bool=False, limit: Optional[int]=None,
+    disable: bool=False,
+):
+    """Configure the library cache.
+
+    Arguments:
+        cachedir: the directory to store the cache entries in; enables the cache
+        enable: enable the cache in the user cache directory if no cachedir is
+            given
+        limit: the maximum total size of the cache in MiB
+        disable: disable the cache
+    """
+    global _dir, _limit
+    if disable:
+        _dir = None
+    elif cachedir is not None:
+        _dir = Path(cachedir)
+    elif enable:
+        _dir = _user_dir()
+    if limit is not None:
+        _limit = limit*1024*1024
+
+
+def clear() -> None:
+    "Remove all entries from the cache"
+    if _dir is not None and _dir.is_dir():
+        for f in _dir.glob(f"*{_suffix}"):
+            f.unlink(missing_ok=True)
+
+
+def key(*, name: str, sources: Iterable[str], dists: Iterable[str]=()) -> str:
+    """Compute the key for a cache entry.
+
+    Arguments:
+        name: the name of the entry
+        sources: names of the modules of this package on which the entry depends;
+            the technology definition is always included.
+        dists: packages on which the entry depends next to the ones used for
+            generating cells.
+    """
+    h = hashlib.sha256()
+    h.update(name.encode())
+    h.update(f"python={sys.version_info[0]}.{sys.version_info[1]}".encode())
+    for dist in (*_dists, *dists):
+        try:
+            v = _md.version(dist)
+        except _md.PackageNotFoundError:
+            v = "none"
+        h.update(f"{dist}={v}".encode())
+    for src in ("pdkmaster.py", *sources):
+        h.update(_moddir.joinpath(src).read_bytes())
+    return h.hexdigest()[:32]
+
+
+def _persistent(extra: Dict[str, Any]) -> Dict[str, Any]:
+    # Objects that are not pickled but are looked up by a persistent id;
+    # this keeps identity with the objects of the running process.
+    from .pdkmaster import tech, cktfab, layoutfab
+
+    persistent: Dict[str, Any] = {
+        "tech": tech, "cktfab": cktfab, "layoutfab": layoutfab,
+    }
+    for prim in tech.primitives:
+        persistent[f"prim:{prim.name}"] = prim
+    for mask in tech.designmasks:
+        persistent[f"mask:{mask.name}"] = mask
+    persistent.update(extra)
+
+    return persistent
+
+
+def _setstate(obj: Any, state: Tuple[Dict[str, Any], Optional[list]]) -> None:
+    # State setter for the PDKMaster list classes; avoids the lookup of
+    # `__setstate__` on an object without state, which recurses infinitely in
+    # `ExtendedListStrMapping.__getattr__()`, and `ExtendedList.extend()`, which
+    # needs the state to be set.
+    d, items = state
+    if items is not None:
+        list.extend(obj, items)
+    obj.__dict__.update(d)
+
+
+def _state(obj: Any) -> Optional[Tuple[Dict[str, Any], Optional[list]]]:
+    # State of the PDKMaster list classes, recognized by their base classes as
+    # they are defined in a private module: lists with attributes and classes
+    # that are both a sequence and a mapping.
+    if isinstance(obj, list) and (type(obj) is not list) and hasattr(obj, "__dict__"):
+        return (dict(obj.__dict__), list(obj))
+    elif isinstance(obj, _abc.MutableSequence) and isinstance(obj, _abc.MutableMapping):
+        return (dict(obj.__dict__), None)
+    else:
+        return None
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, *, persistent: Dict[str, Any]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._ids = {id(obj): pid for pid, obj in persistent.items()}
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        return self._ids.get(id(obj))
+
+    def reducer_override(self, obj: Any) -> Any:
+        state = _state(obj)
+        if state is None:
+            return NotImplemented
+        return (copyreg.__newobj__, (type(obj),), state, None, None, _setstate)
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, *, persistent: Dict[str, Any]):
+        super().__init__(file)
+        self._persistent = persistent
+
+    def persistent_load(self, pid: Any) -> Any:
+        try:
+            return self._persistent[pid]
+        except KeyError:
+            raise pickle.UnpicklingError(f"unknown persistent id '{pid}'")
+
+
+def dumps(obj: Any, *, persistent: Dict[str, Any]) -> bytes:
+    "Pickle an object with objects of the technology replaced by a persistent id"
+    import io
+
+    f = io.BytesIO()
+    _Pickler(f, persistent=_persistent(persistent)).dump(obj)
+    return f.getvalue()
+
+
+def loads(data: bytes, *, persistent: Dict[str, Any]) -> Any:
+    "Unpickle data pickled with `dumps()`"
+    import io
+
+    return _Unpickler(io.BytesIO(data), persistent=_persistent(persistent)).load()
+
+
+def _entry(*, name: str, key: str) -> Path:
+    assert _dir is not None
+    return _dir.joinpath(f"{name}-{key}{_suffix}")
+
+
+def load(*,
+    name: str, libs: Tuple["_lbry.Library", ...], sources: Iterable[str],
+    persistent: Dict[str, Any],
+) -> bool:
+    """Load the cells of one or more libraries from the cache.
+
+    The cells are added to the given libraries, which have to be empty.
+    Returns whether the cells were found in the cache.
+    """
+    if _dir is None:
+        return False
+    f = _entry(name=name, key=key(name=name, sources=sources))
+    try:
+        data = f.read_bytes()
+    except OSError:
+        return False
+    try:
+        cellss = loads(data, persistent=persistent)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError):
+        cellss = None
+    if (not isinstance(cellss, tuple)) or (len(cellss) != len(libs)):
+        # Corrupt or incompatible entry
+        f.unlink(missing_ok=True)
+        return False
+    for lib, cells in zip(libs, cellss):
+        lib.cells += cells
+    # Mark as recently used
+    os.utime(f)
+    return True
+
+
+def store(*,
+    name: str, libs: Tuple["_lbry.Library", ...], sources: Iterable[str],
+    persistent: Dict[str, Any],
+) -> None:
+    """Store the cells of one or more libraries in the cache.
+
+    Circuit and layout of all the cells will be generated before storing them.
+    """
+    if _dir is None:
+        return
+    for lib in libs:
+        for cell in lib.cells:
+            cell.circuit
+            cell.layout
+    try:
+        data = dumps(tuple(tuple(lib.cells) for lib in libs), persistent=persistent)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        warnings.warn(f"Library '{name}' could not be cached: {e}")
+        return
+
+    try:
+        _dir.mkdir(parents=True, exist_ok=True)
+        f = _entry(name=name, key=key(name=name, sources=sources))
+        tmp = f.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, f)
+    except OSError as e:
+        warnings.warn(f"Library '{name}' could not be cached: {e}")
+        return
+
+    _evict(keep=f)
+
+
+def _evict(*, keep: Path) -> None:
+    assert _dir is not None
+    name = keep.name.rsplit("-", maxsplit=1)[0]
+
+    entries = []
+    for f in _dir.glob(f"*{_suffix}"):
+        if f == keep:
+            continue
+        if f.name.rsplit("-", maxsplit=1)[0] == name:
+            # Stale entry for the same library
+            f.unlink(missing_ok=True)
+        else:
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+
+    total = keep.stat().st_size + sum(size for _, size, _ in entries)
+    for _, size, f in sorted(entries):
+        if total <= _get_limit():
+            break
+        f.unlink(missing_ok=True)
+        total -= size
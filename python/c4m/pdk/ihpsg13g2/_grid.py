@@ -0,0 +1,51 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Coordinates in integer units of the technology grid.
+For internal use only.
+
+Layout coordinates computed by this package are done in integer grid units and
+only converted to µm floats when given to PDKMaster. The conversion divides by
+the integer number of grid units per µm, which gives the float closest to the
+decimal value, e.g. the same float as the literal `0.135`, independent of the
+order of the computations.
+"""
+from pdkmaster.technology import geometry as _geo
+
+
+__all__ = ["grid", "per_um", "units", "on_grid", "coord", "point"]
+
+
+# Grid units per µm; grid is 0.005µm
+per_um = 200
+grid = 1/per_um
+# Tolerance in grid units for values that are on the grid
+_eps = 1e-6
+
+
+def units(v: float, *, snap: bool=False) -> int:
+    """Convert a value in µm to grid units.
+
+    Arguments:
+        snap: round a value that is not on the grid to the nearest grid point;
+            otherwise a ValueError is raised.
+    """
+    f = v*per_um
+    n = round(f)
+    if (not snap) and (abs(f - n) > _eps):
+        raise ValueError(f"Value {v} is not on the {grid}µm grid")
+    return n
+
+
+def on_grid(v: float) -> bool:
+    "Whether a value in µm is on the grid"
+    f = v*per_um
+    return abs(f - round(f)) <= _eps
+
+
+def coord(n: int) -> float:
+    "Convert grid units to µm"
+    return n/per_um
+
+
+def point(*, x: int, y: int) -> _geo.Point:
+    "A point with coordinates in grid units"
+    return _geo.Point(x=x/per_um, y=y/per_um)
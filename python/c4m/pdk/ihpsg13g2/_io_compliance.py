@@ -5,25 +5,96 @@ For internal use only.
 This module uses non-backwards compatible parts of the PDKMaster so need to be carefully
 kept up-to-date with these libraries.
 """
-from typing import Optional, Callable, cast
+from typing import Dict, List, Tuple, Iterable, Optional, Callable, Any, cast
 
-from pdkmaster.technology import geometry as _geo, primitive as _prm
-from pdkmaster.design import layout as _lay
-from pdkmaster.design.layout.layout_ import _InstanceSubLayout
+from pdkmaster.technology import geometry as _geo, primitive as _prm, mask as _msk
+from pdkmaster.design import layout as _lay, circuit as _ckt
+from pdkmaster.design.layout.layout_ import _InstanceSubLayout, _MaskShapesSubLayout
 
 from c4m.flexio import GuardRingT, DCDiodeT, PadInT, PadOutT, PadTriOutT, PadInOutT
 from .pdkmaster import tech
+from . import _grid
 
 
 _prims = tech.primitives
+_dcdiodes = ("sg13g2_DCNDiode", "sg13g2_DCPDiode")
+# Width of and space between the active fingers of the DC diodes in µm; used for
+# the IO specification
+dcdiode_actwidth = 1.26
+dcdiode_actspace = 0.99
+# x offset in grid units of the PAD label from the origin of the rotated DC diode
+# instance in PadIn: one and a half active width plus one active space
+_padlabel_dx = -_grid.units(1.5*dcdiode_actwidth + dcdiode_actspace)
+
+
+class _LayoutIndex:
+    """Index of the sublayouts of a layout
+
+    The instance sublayouts are indexed by cell name and by instance, the shapes
+    by net and mask. The index is built in one pass over the sublayouts; it is
+    not updated when the layout changes.
+    """
+    def __init__(self, layout: _lay.LayoutT):
+        self.cells: Dict[str, List[_InstanceSubLayout]] = {}
+        # Sublayouts are stored with their position to keep the order of the layout
+        self._insts: Dict[int, List[Tuple[int, _InstanceSubLayout]]] = {}
+        self._nets: Dict[Any, List[Tuple[int, Dict[_msk.MaskT, List[_geo.MaskShape]]]]] = {}
+        self._subindices: Dict[int, "_LayoutIndex"] = {}
+        self._pos: Dict[int, int] = {}
+        for i, sl in enumerate(layout._sublayouts):
+            if isinstance(sl, _InstanceSubLayout):
+                self.cells.setdefault(sl.inst.cell.name, []).append(sl)
+                self._pos[id(sl)] = i
+                self._insts.setdefault(id(sl.inst), []).append((i, sl))
+            else:
+                assert isinstance(sl, _MaskShapesSubLayout)
+                masks: Dict[_msk.MaskT, List[_geo.MaskShape]] = {}
+                for ms in sl.shapes:
+                    masks.setdefault(ms.mask, []).append(ms)
+                self._nets.setdefault(sl.net, []).append((i, masks))
+
+    def instances(self, *names: str) -> List[_InstanceSubLayout]:
+        "The instance sublayouts of cells with the given names in layout order"
+        return sorted(
+            (sl for name in names for sl in self.cells.get(name, ())),
+            key=lambda sl: self._pos[id(sl)],
+        )
+
+    def subindex(self, sl: _InstanceSubLayout) -> "_LayoutIndex":
+        "The index of the layout of an instance sublayout"
+        try:
+            return self._subindices[id(sl)]
+        except KeyError:
+            idx = self._subindices[id(sl)] = _LayoutIndex(sl.layout)
+            return idx
+
+    def net_polygons(self, *,
+        net: _ckt.CircuitNetT, mask: _msk.MaskT,
+    ) -> Iterable[_geo.MaskShape]:
+        "Same as `filter_polygons(net=net, mask=mask, split=True)` of the layout"
+        items: List[Tuple[int, Any]] = list(self._nets.get(net, ()))
+        for port in net.childports:
+            items.extend(
+                (i, (sl, port.net)) for i, sl in self._insts.get(id(port.inst), ())
+            )
+        items.sort(key=lambda item: item[0])
+        for _, item in items:
+            if isinstance(item, dict):
+                for ms in item.get(mask, ()):
+                    for shape in ms.shape.pointsshapes:
+                        yield _geo.MaskShape(mask=mask, shape=shape)
+            else:
+                sl, subnet = item
+                yield from self.subindex(sl).net_polygons(net=subnet, mask=mask)
 
 
 def guardring_create(gr: GuardRingT, *, create_cb: Optional[Callable[[GuardRingT], None]]) -> None:
     "For p-type guard ring put substrate label for IHP process"
     if gr.type_ == "p":
-        p = _geo.Point(
-            x=(-0.5*gr.width + 0.5*gr.ringwidth), y=(-0.5*gr.height + 0.5*gr.ringwidth)
-        )
+        w = _grid.units(gr.width, snap=True)
+        h = _grid.units(gr.height, snap=True)
+        rw = _grid.units(gr.ringwidth, snap=True)
+        p = _grid.point(x=(rw - w)//2, y=(rw - h)//2)
         lbl = _geo.Label(origin=p, text="sub!")
         gr.layout.add_shape(
             shape=lbl, layer=cast(_prm.Auxiliary, _prims["TEXT"]), net=None,
@@ -36,7 +107,8 @@ def guardring_create(gr: GuardRingT, *, create_cb: Optional[Callable[[GuardRingT
 def dcdiode_create(dio: DCDiodeT, *, create_cb: Optional[Callable[[DCDiodeT], None]]) -> None:
     TEXT = cast(_prm.Auxiliary, _prims["TEXT"])
     if dio.type_ == "n":
-        p = _geo.Point(x=0.5*dio.active_width, y=0.5*dio.active_width)
+        aw = _grid.units(dio.active_width, snap=True)
+        p = _grid.point(x=aw//2, y=aw//2)
         lbl = _geo.Label(origin=p, text="sub!")
         dio.layout.add_shape(
             shape=lbl, layer=TEXT, net=None,
@@ -52,16 +124,15 @@ class PadIn(PadInT):
 
         layout = self.layout
         lbls = []
-        for sl in layout._sublayouts:
-            if (
-                isinstance(sl, _InstanceSubLayout)
-                and (sl.inst.cell.name in ("sg13g2_DCNDiode", "sg13g2_DCPDiode"))
-            ):
-                assert sl.rotation == _geo.Rotation.R90
-                lbls.append(_geo.Label(
-                    origin=(sl.origin + _geo.Point(x=-(1.5*1.26 + 0.99), y=0.0)),
-                    text="PAD",
-                ))
+        for sl in _LayoutIndex(layout).instances(*_dcdiodes):
+            assert sl.rotation == _geo.Rotation.R90
+            lbls.append(_geo.Label(
+                origin=_grid.point(
+                    x=(_grid.units(sl.origin.x, snap=True) + _padlabel_dx),
+                    y=_grid.units(sl.origin.y, snap=True),
+                ),
+                text="PAD",
+            ))
         text = cast(_prm.Auxiliary, _prims["TEXT"])
         for lbl in lbls:
             layout.add_shape(shape=lbl, layer=text, net=None)
@@ -72,29 +143,25 @@ class OutPadLabelsMixin:
     def pad_labels(self, *, layout: _lay.LayoutT):
         metal2 = cast(_prm.MetalWire, _prims["Metal2"])
 
+        index = _LayoutIndex(layout)
         lbls = []
         x = None
-        for sl in layout._sublayouts:
-            if (
-                isinstance(sl, _InstanceSubLayout)
-                and sl.inst.cell.name.startswith("sg13g2_Clamp_N")
-            ):
-                assert sl.rotation == _geo.Rotation.No
-                ckt = sl.inst.circuit
-                pad = ckt.nets["pad"]
-                for ms in sl.layout.filter_polygons(net=pad, mask=metal2.mask, split=True):
-                    assert isinstance(ms.shape, _geo.RectangularT)
-                    x = ms.shape.center.x
-                    break
+        clamps = [name for name in index.cells if name.startswith("sg13g2_Clamp_N")]
+        if clamps:
+            sl = index.cells[clamps[0]][0]
+            assert sl.rotation == _geo.Rotation.No
+            pad = sl.inst.circuit.nets["pad"]
+            for ms in index.subindex(sl).net_polygons(net=pad, mask=metal2.mask):
+                assert isinstance(ms.shape, _geo.RectangularT)
+                x = _grid.units(ms.shape.center.x, snap=True)
                 break
         assert x is not None
-        for sl in layout._sublayouts:
-            if (
-                isinstance(sl, _InstanceSubLayout)
-                and (sl.inst.cell.name in ("sg13g2_DCNDiode", "sg13g2_DCPDiode"))
-            ):
-                assert sl.rotation == _geo.Rotation.No
-                lbls.append(_geo.Label(origin=_geo.Point(x=x, y=sl.origin.y), text="PAD"))
+        for sl in index.instances(*_dcdiodes):
+            assert sl.rotation == _geo.Rotation.No
+            lbls.append(_geo.Label(
+                origin=_grid.point(x=x, y=_grid.units(sl.origin.y, snap=True)),
+                text="PAD",
+            ))
         text = cast(_prm.Auxiliary, _prims["TEXT"])
         for lbl in lbls:
             layout.add_shape(shape=lbl, layer=text, net=None)
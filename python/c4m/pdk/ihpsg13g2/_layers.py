@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""GDS layer map of the technology.
+
+This module does not depend on PDKMaster so the layer map can be used without
+building the technology.
+"""
+from typing import TYPE_CHECKING, Dict, Tuple
+
+if TYPE_CHECKING:
+    from pdkmaster.typing import GDSLayerSpecDict
+else:
+    GDSLayerSpecDict = Dict[str, Tuple[int, int]]
+
+__all__ = ["gds_layers", "textgds_layers"]
+
+
+gds_layers: GDSLayerSpecDict = {
+    "Recog.esd": (99, 30),
+    "Recog.dio": (99, 31),
+}
+textgds_layers: GDSLayerSpecDict = {}
+
+# Use datatype 100 for obstruction layer;
+# datatype 23 'nofill' would cause no dummy generation if accidently not removed before tape-out
+for name, layer, has_pin, has_obs, has_pintext in (
+    ("Activ", 1, True, True, False),
+    ("GatPoly", 5, True, True, False),
+    ("Cont", 6, False, True, False),
+    ("Metal1", 8, True, True, True),
+    ("Passiv", 9, True, False, False),
+    ("Metal2", 10, True, True, True),
+    ("pSD", 14, False, False, False),
+    ("Via1", 19, False, True, False),
+    ("RES", 24, False, False, False),
+    ("SalBlock", 28, False, False, False),
+    ("Via2", 29, False, True, False),
+    ("Metal3", 30, True, True, True),
+    ("NWell", 31, False, False, False),
+    ("Substrate", 40, False, False, False),
+    ("ThickGateOx", 44, False, False, False),
+    ("Via3", 49, False, True, False),
+    ("Metal4", 50, True, True, True),
+    ("TEXT", 63, False, False, False),
+    ("Via4", 66, False, True, False),
+    ("Metal5", 67, True, True, True),
+    ("EXTBlock", 111, False, False, False),
+    ("TopVia1", 125, False, True, False),
+    ("TopMetal1", 126, True, True, True),
+    ("TopVia2", 133, False, True, False),
+    ("TopMetal2", 134, True, True, True),
+    ("prBoundary", 189, False, False, False),
+):
+    gds_layers[name] = (layer, 0)
+    if has_pin:
+        gds_layers[f"{name}.pin"] = (layer, 2)
+    if has_pintext:
+        textgds_layers[f"{name}.pin"] = (layer, 25)
+    if has_obs:
+        gds_layers[f"{name}.obs"] = (layer, 100)
@@ -0,0 +1,210 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Standard cell library with on demand generation of the cells.
+For internal use only.
+
+The cells of the default set are looked up in the calls to `new_cell()` done by
+`add_default()` of the factory; these calls are recorded once without generating
+the cells. A single cell is then generated by doing only its own call.
+"""
+import threading
+from typing import Callable, Dict, Set, Tuple, Optional, Any
+
+from pdkmaster.technology import technology_ as _tch
+from pdkmaster.design import cell as _cell, library as _lbry
+
+from c4m.flexcell import factory as _fab
+
+
+__all__ = ["OnDemandStdCellLibrary"]
+
+
+def _default_cells(fab: _fab.StdCellFactory) -> Dict[str, Dict[str, Any]]:
+    # The arguments of the `new_cell()` calls of `add_default()` by library name,
+    # in the order of the calls
+    calls: Dict[str, Dict[str, Any]] = {}
+
+    def new_cell(*, name: str, **cell_args: Any) -> None:
+        calls[fab.lib_name(name=name)] = {"name": name, **cell_args}
+
+    fab.new_cell = new_cell # type: ignore
+    try:
+        fab.add_default()
+    finally:
+        del fab.new_cell
+    return calls
+
+
+class _OnDemandCells(_cell.CellsT):
+    """Cells of a `OnDemandStdCellLibrary`
+
+    Looking up a cell by name that is not present yet will generate it. Iterating
+    over the cells or looking up by index will first generate all cells of the
+    library. Access is serialized with the lock of the library so other threads
+    never see a partly generated library.
+    """
+    def __init__(self, *, lib: "OnDemandStdCellLibrary"):
+        super().__init__()
+        self._lib = lib
+
+    def __getitem__(self, key):
+        with self._lib.lock:
+            if isinstance(key, str):
+                if key not in self._map_:
+                    self._lib._create_cell_(name=key)
+                return super().__getitem__(key)
+            else:
+                self._lib.generate_all()
+                if isinstance(key, slice):
+                    return _cell.CellsT(self._list_[key])
+                return super().__getitem__(key)
+
+    def __iter__(self):
+        with self._lib.lock:
+            self._lib.generate_all()
+            return iter(tuple(super().__iter__()))
+
+    def __len__(self) -> int:
+        with self._lib.lock:
+            self._lib.generate_all()
+            return super().__len__()
+
+    def keys(self):
+        with self._lib.lock:
+            self._lib.generate_all()
+            return super().keys()
+
+    def values(self):
+        with self._lib.lock:
+            self._lib.generate_all()
+            return super().values()
+
+    def items(self):
+        with self._lib.lock:
+            self._lib.generate_all()
+            return super().items()
+
+
+class OnDemandStdCellLibrary(_lbry.RoutingGaugeLibrary):
+    """A `RoutingGaugeLibrary` where the standard cells are generated on demand.
+
+    `lib.cells["inv_x1"]` only generates the inverter; the full default set of
+    cells is generated the first time the cells are iterated over. The order of
+    the cells is then the same as when generated with `add_default()`.
+
+    Arguments:
+        fab_class: factory class to generate the cells; it is called with the
+            library as `lib` argument.
+        complete_cb: called after all the cells have been generated
+
+    Cells are generated by one thread at a time; see `lock`.
+    """
+    def __init__(self, *,
+        name: str, tech: _tch.Technology, canvas: _fab.StdCellCanvas,
+        fab_class: Callable[..., _fab.StdCellFactory],
+        complete_cb: Optional[Callable[["OnDemandStdCellLibrary"], None]]=None,
+    ):
+        super().__init__(name=name, tech=tech, routinggauge=canvas.routinggauge)
+        self._cells = _OnDemandCells(lib=self)
+        self._fab = fab_class(lib=self)
+        self._complete_cb = complete_cb
+
+        self._lock = threading.RLock()
+        self._defaults: Optional[Dict[str, Dict[str, Any]]] = None
+        self._complete = False
+        self._completing = False
+        self._creating: Set[str] = set()
+        self._reuse: Dict[str, _cell.Cell] = {}
+
+    @property
+    def fab(self) -> _fab.StdCellFactory:
+        return self._fab
+    @property
+    def lock(self) -> threading.RLock:
+        "Lock held while cells are generated or added"
+        return self._lock
+    @property
+    def complete(self) -> bool:
+        "Whether all the cells have been generated"
+        return self._complete
+
+    def has_cell(self, name: str) -> bool:
+        "Whether a cell has been generated already; will not generate the cell"
+        return name in self._cells._map_
+    @property
+    def generated_cells(self) -> Tuple[_cell.Cell, ...]:
+        "The cells generated so far; will not generate cells"
+        with self._lock:
+            return tuple(self._cells._list_)
+
+    def set_complete(self) -> None:
+        """Mark the library as complete without generating cells;
+        to be used after the cells have been added in another way."""
+        self._complete = True
+
+    def generate_all(self) -> None:
+        "Generate the full default set of cells"
+        with self._lock:
+            self._generate_all()
+
+    def _default_cells(self) -> Dict[str, Dict[str, Any]]:
+        if self._defaults is None:
+            self._defaults = _default_cells(self._fab)
+        return self._defaults
+
+    def _generate_all(self) -> None:
+        if self._complete or self._completing:
+            return
+        self._completing = True
+        try:
+            # Regenerate the full set in the default order, cells that were already
+            # generated are put back in the list.
+            cells = self._cells
+            self._reuse = {cell.name: cell for cell in cells._list_}
+            _cell.CellsT.clear(cells)
+            for name, args in self._default_cells().items():
+                if name in self._reuse:
+                    cells += self._reuse.pop(name)
+                elif name not in cells._map_:
+                    self._new_cell(name=name, args=args)
+            # Add cells outside the default set at the end
+            cells += tuple(self._reuse.values())
+            self._reuse = {}
+            self._complete = True
+        finally:
+            self._completing = False
+        if self._complete_cb is not None:
+            self._complete_cb(self)
+
+    def _new_cell(self, *, name: str, args: Dict[str, Any]) -> None:
+        self._creating.add(name)
+        try:
+            self._fab.new_cell(**args)
+        except _fab.NotEnoughRoom:
+            # Not in the default set; `add_default()` ignores it too
+            pass
+        finally:
+            self._creating.remove(name)
+
+    def _create_cell_(self, *, name: str) -> None:
+        # Called when a cell that is not in the library is looked up
+        with self._lock:
+            if name not in self._cells._map_:
+                self._create_cell(name=name)
+
+    def _create_cell(self, *, name: str) -> None:
+        if name in self._reuse:
+            # Looked up by a cell generated while completing the library
+            self._cells += self._reuse.pop(name)
+            return
+        if self._complete or self._completing or (name in self._creating):
+            # Lookup done by the factory to see if the cell exists
+            return
+
+        args = self._default_cells().get(name)
+        if args is None:
+            return
+        elif name == self._fab.lib_name(name="Gallery"):
+            # Contains all the other cells
+            self._generate_all()
+        else:
+            self._new_cell(name=name, args=args)
@@ -0,0 +1,247 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Generation of the libraries with a pool of processes.
+For internal use only.
+
+Each worker generates part of the cells, including circuit and layout, in its own
+library and sends them back pickled with the objects of the technology replaced
+by a persistent id, see `_cache`. The parent adds the cells to its library; when a
+cell with the same name was already added by another worker that one is used.
+Generation is deterministic so both cells are the same.
+"""
+import os, threading, warnings
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, wait
+from typing import Dict, Tuple, List, Iterable, Optional, Any
+
+from pdkmaster.design import cell as _cell, library as _lbry
+
+from . import _cache
+
+
+__all__ = ["generate_libs", "prewarm", "join_prewarm"]
+
+
+# The groups of cells added by StdCellFactory.add_default() except the Gallery
+_stdcell_groups = (
+    "add_fillers", "add_diodes", "add_logicconsts", "add_inverters", "add_buffers",
+    "add_nands", "add_ands", "add_nors", "add_ors", "add_mux2", "add_aooas",
+    "add_xors", "add_latches", "add_flops",
+)
+
+
+def _workers(workers: Optional[int]) -> int:
+    if workers is None:
+        s = os.environ.get("C4M_IHPSG13G2_WORKERS")
+        workers = int(s) if s else 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _generated(cells: Iterable[_cell.Cell]) -> Tuple[_cell.Cell, ...]:
+    # Generating a cell can add cells to a library; iterating over the cells of
+    # a library also visits the cells added during the iteration.
+    ret: List[_cell.Cell] = []
+    for cell in cells:
+        cell.circuit
+        cell.layout
+        ret.append(cell)
+    return tuple(ret)
+
+
+def _stdcell_worker(libname: str, group: str) -> bytes:
+    from . import stdcell
+
+    canvas, fab_class = stdcell._libspecs[libname]
+    lib = _lbry.RoutingGaugeLibrary(
+        name=libname, tech=stdcell.tech, routinggauge=canvas.routinggauge,
+    )
+    fab = fab_class(lib=lib)
+    getattr(fab, group)()
+
+    return _cache.dumps(
+        _generated(lib.cells), persistent={"lib": lib, "fab": fab, "canvas": canvas},
+    )
+
+
+def generate_stdcells(*, lib, workers: int) -> None:
+    """Generate all cells of a `OnDemandStdCellLibrary` from the `stdcell` module
+    with a pool of worker processes.
+    """
+    from . import stdcell
+
+    with lib.lock:
+        if lib.complete:
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = tuple(executor.map(
+                _stdcell_worker, (lib.name for _ in _stdcell_groups), _stdcell_groups,
+            ))
+        persistent = stdcell._persistent(lib)
+        for data in results:
+            cells = _cache.loads(data, persistent=persistent)
+            lib.cells += tuple(cell for cell in cells if not lib.has_cell(cell.name))
+        # Put cells in default order and add the remaining cells
+        lib.generate_all()
+
+
+def _iocell_worker(name: str) -> List[Tuple[bool, str, bytes]]:
+    from . import io
+
+    lib = _lbry.Library(name="sg13g2_io", tech=io.tech)
+    fab = io.IHPSG13g2IOFactory(
+        lib=lib, cktfab=io.cktfab, layoutfab=io.layoutfab, name_prefix="sg13g2_",
+    )
+    fab.get_cell(name)
+    _generated(lib.cells)
+
+    # Pickle cells one by one bottom-up with references to other cells by name.
+    # This allows the parent to use the cells already added by other workers.
+    persistent = io._persistent(fab)
+    cells = _generated(lib.sorted_cells)
+    cellpids = {f"cell:{cell.name}": cell for cell in cells}
+    iolibnames = set(lib.cells.keys())
+    ret = []
+    for cell in cells:
+        pid = f"cell:{cell.name}"
+        cellpersistent = {**persistent, **cellpids}
+        cellpersistent.pop(pid)
+        ret.append((
+            cell.name in iolibnames, cell.name,
+            _cache.dumps(cell, persistent=cellpersistent),
+        ))
+    return ret
+
+
+def generate_iocells(*, fab, workers: int, names: Optional[Iterable[str]]=None) -> None:
+    """Generate the cells of the IO library with a pool of worker processes.
+
+    By default the cells instantiated in the Gallery are generated by the workers,
+    the Gallery itself is generated by the caller.
+    """
+    from . import io
+
+    lib = fab.lib
+    if names is None:
+        names = fab.get_cell("Gallery").cells
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = tuple(executor.map(_iocell_worker, names))
+
+    persistent = io._persistent(fab)
+    cellpids: Dict[str, Any] = {
+        f"cell:{cell.name}": cell
+        for cell in (*lib.cells, *io._iostdlib.cells)
+    }
+    for result in results:
+        for in_iolib, name, data in result:
+            pid = f"cell:{name}"
+            if pid in cellpids:
+                continue
+            cell = _cache.loads(data, persistent={**persistent, **cellpids})
+            if in_iolib:
+                lib.cells += cell
+            else:
+                io._iostdlib.cells += cell
+            cellpids[pid] = cell
+
+
+def generate_libs(*names: str, workers: Optional[int]=None) -> None:
+    """Generate the libraries of the PDK with a pool of worker processes.
+
+    Arguments:
+        names: names of the libraries to generate; "stdcelllib", "stdcell3v3lib"
+            and/or "iolib". If not given all three are generated.
+        workers: number of worker processes. If not given the value of the
+            `C4M_IHPSG13G2_WORKERS` environment variable is used, 1 if not set.
+            A value <= 0 uses the number of CPUs. With 1 worker the libraries are
+            generated in the current process.
+    """
+    from . import stdcell, io
+
+    if not names:
+        names = ("stdcelllib", "stdcell3v3lib", "iolib")
+    workers = _workers(workers)
+
+    for name in names:
+        if name in ("stdcelllib", "stdcell3v3lib"):
+            lib = getattr(stdcell, name)
+            if workers > 1:
+                generate_stdcells(lib=lib, workers=workers)
+            else:
+                lib.generate_all()
+        elif name == "iolib":
+            io._complete_iolib(workers=workers)
+        else:
+            raise ValueError(f"Unknown library '{name}'")
+
+
+# The executors and futures of the libraries started by prewarm()
+_prewarm_lock = threading.Lock()
+_prewarm_executors: List[ThreadPoolExecutor] = []
+_prewarm_futures: Dict[str, "Future[None]"] = {}
+
+
+def _prewarm_done(name: str, future: "Future[None]") -> None:
+    # Report a failure even if the future is never looked at
+    e = future.exception()
+    if e is not None:
+        warnings.warn(f"Generation of library '{name}' in the background failed: {e!r}")
+
+
+def prewarm(*names: str, workers: Optional[int]=None) -> Dict[str, "Future[None]"]:
+    """Generate libraries in background threads.
+
+    Each library is generated in its own thread with `generate_libs()`; threads
+    accessing a library while it is generated wait until it is complete.
+    Returns a future for each library that is done when the library is complete.
+    A failed generation is reported with a warning; `join_prewarm()` waits for
+    the libraries and raises the error.
+
+    Arguments:
+        names: names of the libraries to generate; see `generate_libs()`
+        workers: number of worker processes per library; see `generate_libs()`
+    """
+    if not names:
+        names = ("stdcelllib", "stdcell3v3lib", "iolib")
+    for name in names:
+        if name not in ("stdcelllib", "stdcell3v3lib", "iolib"):
+            raise ValueError(f"Unknown library '{name}'")
+
+    executor = ThreadPoolExecutor(
+        max_workers=len(names), thread_name_prefix="c4m-ihpsg13g2-prewarm",
+    )
+    futures = {
+        name: executor.submit(generate_libs, name, workers=workers) for name in names
+    }
+    for name, future in futures.items():
+        future.add_done_callback(partial(_prewarm_done, name))
+    with _prewarm_lock:
+        _prewarm_executors.append(executor)
+        _prewarm_futures.update(futures)
+    return futures
+
+
+def join_prewarm(timeout: Optional[float]=None) -> None:
+    """Wait until the libraries started by `prewarm()` are generated and end the
+    background threads.
+
+    The error of a failed generation is raised; a `TimeoutError` is raised if the
+    libraries are not generated within `timeout` seconds.
+    """
+    with _prewarm_lock:
+        executors = tuple(_prewarm_executors)
+        futures = dict(_prewarm_futures)
+    _, not_done = wait(futures.values(), timeout=timeout)
+    if not_done:
+        names = ", ".join(name for name, future in futures.items() if future in not_done)
+        raise TimeoutError(f"Libraries not generated in time: {names}")
+    with _prewarm_lock:
+        for executor in executors:
+            executor.shutdown(wait=True)
+            _prewarm_executors.remove(executor)
+        for name, future in futures.items():
+            if _prewarm_futures.get(name) is future:
+                del _prewarm_futures[name]
+    for future in futures.values():
+        future.result()
@@ -0,0 +1,152 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""In-memory cache of primitive layouts.
+For internal use only.
+
+`layoutfab` generates the layout of a primitive, including the labels added by
+the create callback, once for each primitive and parameter set; afterwards a copy
+of the cached layout is returned. The cache is shared by all users of `layoutfab`:
+the standard cell and IO factories and the KLayout PCell library. The least
+recently used layouts are evicted when the cache is full.
+
+The nets given with `portnets` are part of the key by name. In the cached layout
+they are replaced by the ports of the primitive so the cache does not refer to
+the nets of a circuit; in the returned copy the ports are replaced again by the
+given nets.
+
+The maximum number of layouts can be set with the `C4M_IHPSG13G2_PRIMCACHE`
+environment variable or with `configure()`; 0 disables the cache.
+"""
+import os, threading, warnings
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Any
+
+from pdkmaster.technology import net as _net, primitive as _prm
+from pdkmaster.design import layout as _lay
+from pdkmaster.design.layout.layout_ import _MaskShapesSubLayout
+
+
+__all__ = ["configure", "clear", "stats"]
+
+
+# Parsed from the environment when first needed
+_maxsize: Optional[int] = None
+_layouts: "OrderedDict[Hashable, _lay.LayoutT]" = OrderedDict()
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+# Parameter sets that can't be used as key
+_uncached = 0
+
+
+def _get_maxsize() -> int:
+    global _maxsize
+    if _maxsize is None:
+        s = os.environ.get("C4M_IHPSG13G2_PRIMCACHE", "4096")
+        try:
+            _maxsize = int(s)
+        except ValueError:
+            warnings.warn(f"Invalid C4M_IHPSG13G2_PRIMCACHE '{s}'; using 4096")
+            _maxsize = 4096
+    return _maxsize
+
+
+def configure(*, maxsize: Optional[int]=None):
+    """Configure the primitive layout cache.
+
+    Arguments:
+        maxsize: the maximum number of cached layouts; 0 disables the cache
+    """
+    global _maxsize
+    if maxsize is not None:
+        with _lock:
+            _maxsize = maxsize
+            while len(_layouts) > max(_maxsize, 0):
+                _layouts.popitem(last=False)
+
+
+def clear() -> None:
+    "Remove all layouts from the cache and reset the statistics"
+    global _hits, _misses, _uncached
+    with _lock:
+        _layouts.clear()
+        _hits = _misses = _uncached = 0
+
+
+def stats() -> Dict[str, int]:
+    "Hits, misses, uncachable calls, size and maximum size of the cache"
+    with _lock:
+        return {
+            "hits": _hits, "misses": _misses, "uncached": _uncached,
+            "size": len(_layouts), "maxsize": _get_maxsize(),
+        }
+
+
+def _norm(value: Any) -> Hashable:
+    # Lists and dicts, e.g. portnets, as tuples; raises TypeError for
+    # values that can't be hashed
+    if isinstance(value, dict):
+        return (dict, tuple(sorted(
+            ((k, _norm(v)) for k, v in value.items()), key=lambda kv: kv[0],
+        )))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_norm(v) for v in value)
+    else:
+        hash(value)
+        # Distinguish 1 and 1.0 and True
+        return (type(value), value)
+
+
+def _rebound(layout: _lay.LayoutT, nets: Dict[int, _net.NetT]) -> _lay.LayoutT:
+    # Copy of the layout with the nets replaced; nets given by id as they
+    # compare by name
+    layout = layout.dup()
+    for sl in layout._sublayouts:
+        if isinstance(sl, _MaskShapesSubLayout) and (id(sl.net) in nets):
+            sl._net = nets[id(sl.net)]
+    return layout
+
+
+def _ports(prim: _prm.PrimitiveT, portnets: Dict[str, _net.NetT]) -> Dict[int, Any]:
+    # Port of the primitive for each of the nets; the first port in name order
+    # for a net connected to more than one port
+    ports: Dict[int, Any] = {}
+    for name, net in sorted(portnets.items(), key=lambda kv: kv[0]):
+        ports.setdefault(id(net), (prim.ports[name], net))
+    return ports
+
+
+class CachedLayoutFactory(_lay.LayoutFactory):
+    """Layout factory returning copies of cached primitive layouts"""
+    def layout_primitive(self, prim: _prm.PrimitiveT, **prim_params) -> _lay.LayoutT:
+        global _hits, _misses, _uncached
+
+        maxsize = _get_maxsize()
+        if maxsize <= 0:
+            return super().layout_primitive(prim, **prim_params)
+        try:
+            key = (prim.name, _norm(prim_params))
+        except TypeError:
+            with _lock:
+                _uncached += 1
+            return super().layout_primitive(prim, **prim_params)
+
+        portnets = prim_params.get("portnets", {})
+        with _lock:
+            cached = _layouts.get(key)
+            if cached is not None:
+                _layouts.move_to_end(key)
+                _hits += 1
+            else:
+                _misses += 1
+        ports = _ports(prim, portnets)
+        if cached is None:
+            layout = super().layout_primitive(prim, **prim_params)
+            cached = _rebound(layout, {i: port for i, (port, _) in ports.items()})
+            with _lock:
+                _layouts[key] = cached
+                while len(_layouts) > maxsize:
+                    _layouts.popitem(last=False)
+            return layout
+        else:
+            # The caller may modify the returned layout
+            return _rebound(cached, {id(port): net for port, net in ports.values()})
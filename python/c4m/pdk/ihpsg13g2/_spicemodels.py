@@ -0,0 +1,224 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Flattened SPICE model files.
+For internal use only.
+
+`models/all.spice` selects the models of a corner with `.lib` sections that
+include the corner files, which in turn include the model and parameter files.
+For each corner combination this module writes one self-contained file: all
+`.lib` and `.include` statements are resolved, comments are removed and only the
+subcircuits and models that are (indirectly) referenced by the given model names
+are kept.
+
+The files are stored in the `spicemodels` subdirectory of the library cache,
+see `_cache`, or in a temporary directory if the cache is disabled. The file name
+contains a hash of the content of the model files so a changed model file never
+gives an outdated flattened file.
+"""
+import os, re, atexit, shutil, hashlib, tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple, Set, Iterable, Optional
+
+from . import _cache
+
+
+__all__ = ["flat_corner", "flatten", "model_file"]
+
+
+_modeldir = Path(__file__).parent.joinpath("models")
+_libfile = _modeldir.joinpath("all.spice")
+_version = "1"
+# Name of the .lib section in the flattened files
+flat_corner = "flat"
+
+# A statement: a line with its continuation lines
+_StmtT = List[str]
+
+
+def _statements(path: Path) -> List[_StmtT]:
+    # Statements of a file without comment and empty lines
+    stmts: List[_StmtT] = []
+    for line in path.read_text(errors="replace").splitlines():
+        line = line.rstrip()
+        s = line.lstrip()
+        if not s or s.startswith("*"):
+            continue
+        if s.startswith("+") and stmts:
+            stmts[-1].append(line)
+        else:
+            stmts.append([line])
+    return stmts
+
+
+def _keyword(stmt: _StmtT) -> Tuple[str, List[str]]:
+    words = stmt[0].split()
+    return words[0].lower(), words[1:]
+
+
+def _file(dir: Path, s: str) -> Path:
+    return dir.joinpath(s.strip("\"'"))
+
+
+def _section(path: Path, name: str) -> List[_StmtT]:
+    section: Optional[List[_StmtT]] = None
+    for stmt in _statements(path):
+        kw, args = _keyword(stmt)
+        if section is None:
+            if (kw == ".lib") and (len(args) == 1) and (args[0].lower() == name.lower()):
+                section = []
+        elif kw == ".endl":
+            return section
+        else:
+            section.append(stmt)
+    raise ValueError(f"No .lib section '{name}' in '{path}'")
+
+
+def _expand(stmts: List[_StmtT], *, dir: Path) -> List[_StmtT]:
+    # Replace .lib and .include statements by the statements they refer to;
+    # file names are relative to the file with the statement.
+    expanded: List[_StmtT] = []
+    for stmt in stmts:
+        kw, args = _keyword(stmt)
+        if (kw == ".lib") and (len(args) == 2):
+            f = _file(dir, args[0])
+            expanded.extend(_expand(_section(f, args[1]), dir=f.parent))
+        elif kw in (".include", ".inc"):
+            f = _file(dir, args[0])
+            expanded.extend(_expand(_statements(f), dir=f.parent))
+        else:
+            expanded.append(stmt)
+    return expanded
+
+
+def _tokens(stmts: Iterable[_StmtT]) -> Set[str]:
+    return set(re.split(
+        r"[\s=(),'{}*/+-]+", " ".join(line for stmt in stmts for line in stmt).lower(),
+    ))
+
+
+def _prune(stmts: List[_StmtT], *, roots: Optional[Set[str]]) -> List[_StmtT]:
+    # Remove the subcircuit and model definitions that are not referenced by the
+    # roots; if no roots are given, e.g. for the body of a subcircuit, they are the
+    # references from the other statements.
+    items: List[Tuple[Optional[str], List[_StmtT]]] = []
+    i = 0
+    while i < len(stmts):
+        stmt = stmts[i]
+        kw, args = _keyword(stmt)
+        if kw == ".subckt":
+            depth = 1
+            j = i + 1
+            while depth > 0:
+                kw2, _ = _keyword(stmts[j])
+                if kw2 == ".subckt":
+                    depth += 1
+                elif kw2 == ".ends":
+                    depth -= 1
+                j += 1
+            body = _prune(stmts[(i + 1):(j - 1)], roots=None)
+            items.append((args[0].lower(), [stmt, *body, stmts[j - 1]]))
+            i = j
+        else:
+            items.append(((args[0].lower() if kw == ".model" else None), [stmt]))
+            i += 1
+
+    defs: Dict[str, List[_StmtT]] = {}
+    for name, item in items:
+        if name is not None:
+            defs.setdefault(name, []).extend(item)
+    if roots is None:
+        roots = _tokens(stmt for name, item in items if name is None for stmt in item)
+
+    keep: Set[str] = set()
+    todo = [name for name in roots if name in defs]
+    while todo:
+        name = todo.pop()
+        if name not in keep:
+            keep.add(name)
+            todo.extend(token for token in _tokens(defs[name]) if token in defs)
+
+    return [
+        stmt for name, item in items if (name is None) or (name in keep)
+        for stmt in item
+    ]
+
+
+def flatten(*, corner: Iterable[str], models: Iterable[str]) -> str:
+    """Return the content of the flattened model file for a corner combination.
+
+    Arguments:
+        corner: the corners, the names of the sections in `models/all.spice`
+        models: names of the subcircuits and models to keep
+    """
+    corner = tuple(corner)
+    stmts = _expand(
+        [[f".lib {_libfile.name} {c}"] for c in corner], dir=_libfile.parent,
+    )
+    stmts = _prune(stmts, roots={model.lower() for model in models})
+
+    return "\n".join((
+        f"* Flattened models for corners {', '.join(corner)}",
+        f".lib {flat_corner}",
+        *(line for stmt in stmts for line in stmt),
+        f".endl {flat_corner}",
+        "",
+    ))
+
+
+_digest: Optional[str] = None
+def _key(*, corner: Tuple[str, ...], models: Tuple[str, ...]) -> str:
+    global _digest
+    if _digest is None:
+        h = hashlib.sha256()
+        for f in sorted(_modeldir.iterdir()):
+            if f.suffix in (".lib", ".spice"):
+                h.update(f.name.encode())
+                h.update(f.read_bytes())
+        _digest = h.hexdigest()
+    h = hashlib.sha256()
+    for s in (_version, _digest, ",".join(corner), ",".join(sorted(models))):
+        h.update(s.encode())
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+_tmpdir: Optional[Path] = None
+def _dir() -> Path:
+    global _tmpdir
+    if _cache._dir is not None:
+        return _cache._dir.joinpath("spicemodels")
+    if _tmpdir is None:
+        _tmpdir = Path(tempfile.mkdtemp(prefix="c4m-ihpsg13g2-"))
+        atexit.register(shutil.rmtree, _tmpdir, ignore_errors=True)
+    return _tmpdir
+
+
+def model_file(*, corner: Iterable[str], models: Iterable[str]) -> Path:
+    """Return the flattened model file for a corner combination.
+
+    The file is generated if it is not in the cache. It contains one `.lib`
+    section named `flat_corner`.
+
+    Arguments:
+        corner: the corners, the names of the sections in `models/all.spice`
+        models: names of the subcircuits and models to keep
+    """
+    corner = tuple(corner)
+    models = tuple(models)
+    name = "+".join(corner)
+    key = _key(corner=corner, models=models)
+
+    d = _dir()
+    f = d.joinpath(f"{name}-{key}.spice")
+    if f.is_file():
+        return f
+
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = f.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(flatten(corner=corner, models=models))
+    os.replace(tmp, f)
+    # Remove outdated files for the same corners
+    for old in d.glob(f"{name}-*.spice"):
+        if old != f:
+            old.unlink(missing_ok=True)
+
+    return f
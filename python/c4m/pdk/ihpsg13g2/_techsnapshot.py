@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Precompiled snapshot of the technology.
+For internal use only.
+
+Building the technology object creates all the primitives and derives the rules
+and masks; loading a pickled snapshot avoids this at process start. The snapshot
+is validated against a hash of the technology definition and of the versions of
+the packages used, see `_cache.key()`; when it does not match the technology is
+built the normal way.
+
+The snapshot is searched in the file given by the `C4M_IHPSG13G2_TECHSNAPSHOT`
+environment variable; if not set the `tech.snapshot` file next to this module is
+used. An empty value disables the snapshot. The snapshot can be (re)generated
+with:
+
+    python -m c4m.pdk.ihpsg13g2._techsnapshot [file]
+"""
+import os, sys, io, pickle, warnings
+from pathlib import Path
+from typing import Optional, Any
+
+from . import _cache
+
+
+__all__ = ["load", "write"]
+
+
+_magic = b"C4MTECH2"
+# Modules of this package the technology and its snapshot are built from, next to
+# `pdkmaster.py`, which is always included in the key
+_sources = ("_grid.py", "_layers.py", "_cache.py", "_techsnapshot.py")
+
+
+def _file() -> Optional[Path]:
+    s = os.environ.get("C4M_IHPSG13G2_TECHSNAPSHOT")
+    if s is None:
+        return Path(__file__).parent.joinpath("tech.snapshot")
+    elif not s:
+        return None
+    else:
+        return Path(s)
+
+
+def _key() -> bytes:
+    return _cache.key(name="tech", sources=_sources).encode()
+
+
+def load(*, cls: type) -> Optional[Any]:
+    """Load the technology from the snapshot.
+
+    Returns None if there is no valid snapshot of a technology of class `cls`.
+    """
+    f = _file()
+    if f is None:
+        return None
+    try:
+        data = f.read_bytes()
+    except OSError:
+        return None
+    key = _key()
+    header = _magic + key
+    if not data.startswith(header):
+        # Outdated snapshot
+        return None
+    try:
+        # The PDKMaster list classes need the pickler of the cache
+        tech = _cache._Unpickler(io.BytesIO(data[len(header):]), persistent={}).load()
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError) as e:
+        warnings.warn(f"Technology snapshot '{f}' could not be loaded: {e}")
+        return None
+    return tech if type(tech) is cls else None
+
+
+def write(file: Optional[str]=None) -> Path:
+    """Write a snapshot of the technology built from its definition.
+
+    Arguments:
+        file: the file to write to; if not given the default snapshot file.
+    """
+    f = Path(file) if file is not None else _file()
+    if f is None:
+        raise ValueError("Technology snapshot disabled and no file given")
+
+    # Always snapshot a freshly built technology
+    from .pdkmaster import _IHPSG13G2
+
+    buf = io.BytesIO()
+    _cache._Pickler(buf, persistent={}).dump(_IHPSG13G2())
+    data = _magic + _key() + buf.getvalue()
+    tmp = f.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, f)
+
+    return f
+
+
+if __name__ == "__main__":
+    print(write(*sys.argv[1:2]))
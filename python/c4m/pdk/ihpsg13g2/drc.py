@@ -0,0 +1,359 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Run the KLayout DRC deck, optionally incrementally
+
+For an incremental run the state of the previous run is stored next to the report
+database. It contains a hash of the content of each cell, without the content of
+its subcells. On the next run only the regions where a cell changed, enlarged
+with a halo, are checked again; the results for those regions replace the ones of
+the previous report.
+
+The deck is run in tiled mode so the results are all reported in the top cell.
+This module needs the `klayout` Python module and the `klayout` executable.
+The decks are taken from the `tech/drc` directory of the KLayout package of this
+PDK, which has the same layout as the source tree. Another directory can be given
+with the `C4M_IHPSG13G2_TECHDIR` environment variable.
+
+Optionally a profile with the wall time and memory use of each layer derivation
+and rule is written, as JSON if the file name ends with `.json`, otherwise as
+CSV. For an incremental run the profiles of the checked regions are summed.
+"""
+import os, csv, json, hashlib, subprocess, tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional, Any
+
+from klayout import db as _kdb, rdb as _krdb
+
+
+__all__ = ["drc_halo", "run_drc"]
+
+
+_stateversion = 1
+drc_halo: float
+_drc_halo: Optional[float] = None
+
+
+def _drcfile(name: str) -> Path:
+    s = os.environ.get("C4M_IHPSG13G2_TECHDIR")
+    techdir = Path(s) if s else Path(__file__).parents[4].joinpath("tech")
+    f = techdir.joinpath("drc", name)
+    if not f.is_file():
+        raise FileNotFoundError(
+            f"DRC deck '{f}' not found; install the PDK as KLayout package or set"
+            " C4M_IHPSG13G2_TECHDIR to its tech directory"
+        )
+    return f
+
+
+# Properties of the rules that are distances between or across edges
+_distances = ("width", "space", "enclosed_by", "extend_over")
+
+
+def _rule_distance(rule: Any) -> Optional[float]:
+    # The distance checked by a minimum or exact width, spacing, enclosure or
+    # extension rule; None for other rules, e.g. area, length or maximum rules.
+    from pdkmaster.technology import property_ as _prp
+
+    ops = _prp.Operators
+    if not isinstance(rule, (ops.Greater, ops.GreaterEqual, ops.Equal)):
+        return None
+    if getattr(rule.left, "prop_name", None) not in _distances:
+        return None
+    value = rule.right
+    if isinstance(value, _prp.Enclosure):
+        return max(value.spec)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _get_drc_halo() -> float:
+    # 20% more than the largest distance checked by the rules. The conditions of
+    # the rules, e.g. the wire length of a wide metal spacing, are not distances
+    # between shapes and are not included.
+    global _drc_halo
+    if _drc_halo is None:
+        from .pdkmaster import tech
+
+        _drc_halo = round(1.2*max(
+            d for d in (_rule_distance(rule) for rule in tech.rules) if d is not None
+        ), 6)
+    return _drc_halo
+
+
+def _cell_hashes(layout: _kdb.Layout) -> Dict[str, str]:
+    # Hash of the shapes and instances of each cell; the content of the subcells
+    # is not included
+    layers = [(li, layout.get_info(li).to_s()) for li in layout.layer_indexes()]
+    hashes = {}
+    for cell in layout.each_cell():
+        h = hashlib.sha256()
+        for li, info in layers:
+            shapes = sorted(shape.to_s() for shape in cell.shapes(li).each())
+            if shapes:
+                h.update(info.encode())
+                for shape in shapes:
+                    h.update(shape.encode())
+        for inst in sorted(inst.to_s() for inst in cell.each_inst()):
+            h.update(inst.encode())
+        hashes[cell.name] = h.hexdigest()
+    return hashes
+
+
+def _dirty_boxes(*,
+    layout: _kdb.Layout, top: _kdb.Cell, hashes: Dict[str, str], state: Dict[str, Any],
+    halo: float,
+) -> Optional[List[_kdb.DBox]]:
+    # Boxes in the top cell that need to be checked again; None if the full
+    # layout needs to be checked.
+    oldcells: Dict[str, Any] = state["cells"]
+    if (state.get("top") != top.name) or (state.get("dbu") != layout.dbu):
+        return None
+
+    changed: Dict[int, _kdb.Box] = {}
+    for cell in layout.each_cell():
+        old = oldcells.get(cell.name)
+        if (old is None) or (old["hash"] != hashes[cell.name]):
+            if cell.cell_index() == top.cell_index():
+                return None
+            # Removed shapes are inside the old bounding box
+            box = cell.bbox()
+            if (old is not None) and (old["bbox"] is not None):
+                box += _kdb.Box(*old["bbox"])
+            changed[cell.cell_index()] = box
+    if not changed:
+        return []
+
+    region = _kdb.Region()
+    it = _kdb.RecursiveInstanceIterator(layout, top)
+    it.targets = list(changed.keys())
+    while not it.at_end():
+        trans = it.trans()*it.inst_trans()
+        region.insert(trans*changed[it.inst_cell().cell_index()])
+        it.next()
+    region = region.sized(round(halo/layout.dbu))
+
+    # Merge the boxes until they don't overlap
+    n = -1
+    while n != region.count():
+        n = region.count()
+        region = _kdb.Region([
+            _kdb.Polygon(polygon.bbox()) for polygon in region.merged().each()
+        ])
+    region.merge()
+
+    topbox = top.bbox()
+    if region.area() > 0.5*topbox.area():
+        return None
+    return [polygon.bbox().to_dtype(layout.dbu) for polygon in region.each()]
+
+
+def _value_box(value: _krdb.RdbItemValue) -> Optional[_kdb.DBox]:
+    if value.is_box():
+        return value.box()
+    elif value.is_polygon():
+        return value.polygon().bbox()
+    elif value.is_edge_pair():
+        return value.edge_pair().bbox()
+    elif value.is_edge():
+        return value.edge().bbox()
+    elif value.is_path():
+        return value.path().bbox()
+    elif value.is_text():
+        return value.text().bbox()
+    else:
+        return None
+
+
+def _copy_items(*,
+    src: _krdb.ReportDatabase, dst: _krdb.ReportDatabase, boxes: List[_kdb.DBox],
+    inside: bool, exclude: List[_kdb.DBox]=[],
+) -> None:
+    # Copy the items that touch one of the boxes (inside) or none of them;
+    # items touching one of the exclude boxes are never copied.
+    for item in src.each_item():
+        ibox = _kdb.DBox()
+        for value in item.each_value():
+            vbox = _value_box(value)
+            if vbox is not None:
+                ibox += vbox
+        if any(ibox.touches(box) for box in boxes) != inside:
+            continue
+        if any(ibox.touches(box) for box in exclude):
+            continue
+
+        srccat = src.category_by_id(item.category_id())
+        cat = dst.category_by_path(srccat.path())
+        if cat is None:
+            cat = dst.create_category(srccat.name())
+            cat.description = srccat.description
+        srccell = src.cell_by_id(item.cell_id())
+        cell = dst.cell_by_qname(srccell.qname())
+        if cell is None:
+            cell = dst.create_cell(srccell.name())
+        newitem = dst.create_item(cell.rdb_id(), cat.rdb_id())
+        for value in item.each_value():
+            newitem.add_value(value)
+
+
+def _klayout(*,
+    gds: str, report: str, deck: Path, klayout: str, threads: Optional[int],
+    halo: float, clip: Optional[_kdb.DBox], profile: Optional[str]=None,
+) -> None:
+    # The runner reads the rules from the generated deck
+    args = [
+        klayout, "-b", "-r", str(_drcfile("DRC_run.drc")), "-rd", f"deck={deck}",
+        "-rd", f"input={gds}", "-rd", f"report={report}", "-rd", "mode=tiled",
+        "-rd", f"tile_border={halo}",
+    ]
+    if threads is not None:
+        args += ["-rd", f"threads={threads}"]
+    if clip is not None:
+        args += ["-rd", f"clip={clip.left},{clip.bottom},{clip.right},{clip.top}"]
+    if profile is not None:
+        args += ["-rd", f"profile={profile}"]
+    subprocess.run(args, check=True)
+
+
+_profilefields = ("kind", "name", "time", "memory", "memory_delta")
+
+
+def _sum_profiles(profiles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Time and memory increase are summed, memory is the maximum
+    steps: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for profile in profiles:
+        for step in profile["steps"]:
+            key = (step["kind"], step["name"])
+            if key not in steps:
+                steps[key] = dict(step)
+            else:
+                s = steps[key]
+                s["time"] += step["time"]
+                s["memory"] = max(s["memory"], step["memory"])
+                s["memory_delta"] += step["memory_delta"]
+    return list(steps.values())
+
+
+def _write_profile(file: str, *,
+    steps: List[Dict[str, Any]], threads: Optional[int], boxes: int,
+) -> None:
+    if file.endswith(".json"):
+        profile = {
+            "mode": "tiled", "threads": threads, "clip": None, "boxes": boxes,
+            "steps": steps,
+        }
+        Path(file).write_text(json.dumps(profile, indent=2) + "\n")
+    else:
+        with open(file, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=_profilefields)
+            writer.writeheader()
+            writer.writerows(steps)
+
+
+def run_drc(gds: str, report: str, *,
+    incremental: bool=True, halo: Optional[float]=None, threads: Optional[int]=None,
+    klayout: str="klayout", deck: Optional[str]=None, profile: Optional[str]=None,
+) -> None:
+    """Run DRC on a GDS file.
+
+    Arguments:
+        gds: the GDS file to check
+        report: the KLayout report database file to write
+        incremental: if the report and its state from a previous run exist only
+            check the regions that changed and merge the results with the
+            previous report.
+        halo: the distance around the changed regions that is checked again and
+            the tile border; has to be bigger than the largest rule distance.
+            Default is `drc_halo`, derived from the rules of the technology.
+        threads: number of threads; default number of CPUs
+        klayout: the KLayout executable
+        deck: the generated DRC deck with the rules; default the one of this PDK
+        profile: the file to write the profile of the run to
+    """
+    deckpath = _drcfile("DRC.lydrc") if deck is None else Path(deck)
+    if halo is None:
+        halo = _get_drc_halo()
+    statefile = Path(f"{report}.state.json")
+
+    layout = _kdb.Layout()
+    layout.read(gds)
+    top = layout.top_cell()
+    hashes = _cell_hashes(layout)
+
+    boxes: Optional[List[_kdb.DBox]] = None
+    if incremental and Path(report).is_file():
+        try:
+            state = json.loads(statefile.read_text())
+        except (OSError, ValueError):
+            state = None
+        if (state is not None) and (state.get("version") == _stateversion):
+            boxes = _dirty_boxes(
+                layout=layout, top=top, hashes=hashes, state=state, halo=halo,
+            )
+
+    if boxes is None:
+        _klayout(
+            gds=gds, report=report, deck=deckpath, klayout=klayout, threads=threads,
+            halo=halo, clip=None, profile=profile,
+        )
+    elif not boxes:
+        if profile is not None:
+            _write_profile(profile, steps=[], threads=threads, boxes=0)
+    else:
+        old = _krdb.ReportDatabase("")
+        old.load(report)
+        merged = _krdb.ReportDatabase(old.description)
+        merged.top_cell_name = old.top_cell_name
+        merged.original_file = gds
+        merged.generator = old.generator
+        _copy_items(src=old, dst=merged, boxes=boxes, inside=False)
+        profiles: List[Dict[str, Any]] = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i, box in enumerate(boxes):
+                boxreport = str(Path(tmpdir).joinpath(f"box{i}.lyrdb"))
+                boxprofile = (
+                    None if profile is None
+                    else str(Path(tmpdir).joinpath(f"box{i}.profile.json"))
+                )
+                # Check with halo so all results inside the box are found
+                _klayout(
+                    gds=gds, report=boxreport, deck=deckpath, klayout=klayout,
+                    threads=threads, halo=halo, clip=box.enlarged(halo, halo),
+                    profile=boxprofile,
+                )
+                if boxprofile is not None:
+                    profiles.append(json.loads(Path(boxprofile).read_text()))
+                new = _krdb.ReportDatabase("")
+                new.load(boxreport)
+                # Items on the border of two boxes are taken from the first box
+                _copy_items(
+                    src=new, dst=merged, boxes=[box], inside=True, exclude=boxes[:i],
+                )
+        merged.save(report)
+        if profile is not None:
+            _write_profile(
+                profile, steps=_sum_profiles(profiles), threads=threads,
+                boxes=len(boxes),
+            )
+
+    statefile.write_text(json.dumps(_state(layout=layout, top=top, hashes=hashes)))
+
+
+def _state(*,
+    layout: _kdb.Layout, top: _kdb.Cell, hashes: Dict[str, str],
+) -> Dict[str, Any]:
+    return {
+        "version": _stateversion, "top": top.name, "dbu": layout.dbu,
+        "cells": {
+            cell.name: {"hash": hashes[cell.name], "bbox": _box_list(cell.bbox())}
+            for cell in layout.each_cell()
+        },
+    }
+
+
+def _box_list(box: _kdb.Box) -> Optional[Tuple[int, int, int, int]]:
+    return None if box.empty() else (box.left, box.bottom, box.right, box.top)
+
+
+def __getattr__(name: str) -> Any:
+    if name == "drc_halo":
+        return _get_drc_halo()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,485 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Streaming GDSII export
+
+Contrary to exporting through a KLayout database the cells are written to the
+file one by one without building a copy of the whole library in a KLayout
+database. Optionally the layout of a cell generated on demand is released once it
+and all the exported cells instantiating it are written; which cells instantiate
+a cell is derived from the circuits before writing. The peak memory is then
+bounded by the hierarchy of the biggest exported cell and the cells that are not
+generated on demand. For the full IO library this is the whole library as the
+`Gallery` cell instantiates all the cells.
+
+Regular repetitions are written as arrays (AREF): instances of the same cell with
+the same rotation placed on a regular grid, e.g. the clamp and diode fingers of
+the IO cells, and `RepeatedShape` shapes. The latter are put in a helper cell
+named `<cell>$rep<n>`.
+
+This module uses non-backwards compatible parts of the PDKMaster so need to be
+carefully kept up-to-date with this library.
+"""
+import struct, time, warnings
+from itertools import groupby
+from typing import BinaryIO, Dict, Set, Tuple, List, Iterable, Union, Optional, Any
+
+from pdkmaster.technology import geometry as _geo
+from pdkmaster.design import circuit as _ckt, cell as _cell, library as _lbry
+from pdkmaster.design.layout.layout_ import _MaskShapesSubLayout, _InstanceSubLayout
+
+from ._layers import gds_layers as _gds_layers, textgds_layers as _textgds_layers
+
+
+__all__ = ["stream_gds"]
+
+
+# GDSII record types including data type
+_HEADER = 0x0002
+_BGNLIB = 0x0102
+_LIBNAME = 0x0206
+_UNITS = 0x0305
+_ENDLIB = 0x0400
+_BGNSTR = 0x0502
+_STRNAME = 0x0606
+_ENDSTR = 0x0700
+_BOUNDARY = 0x0800
+_SREF = 0x0A00
+_TEXT = 0x0C00
+_LAYER = 0x0D02
+_DATATYPE = 0x0E02
+_XY = 0x1003
+_ENDEL = 0x1100
+_SNAME = 0x1206
+_TEXTTYPE = 0x1602
+_STRING = 0x1906
+_STRANS = 0x1A01
+_ANGLE = 0x1C05
+_AREF = 0x0B00
+_COLROW = 0x1302
+
+# Maximum number of points in a XY record
+_maxpoints = 8190
+# Maximum number of columns or rows of an array
+_maxcolrow = 32767
+
+# (reflection around x-axis, angle) for the rotations; reflection is done first
+_strans: Dict[_geo.Rotation, Any] = {
+    _geo.Rotation.No: (False, 0.0),
+    _geo.Rotation.R90: (False, 90.0),
+    _geo.Rotation.R180: (False, 180.0),
+    _geo.Rotation.R270: (False, 270.0),
+    _geo.Rotation.MX: (True, 0.0),
+    _geo.Rotation.MX90: (True, 90.0),
+    _geo.Rotation.MY: (True, 180.0),
+    _geo.Rotation.MY90: (True, 270.0),
+}
+
+
+def _real8(v: float) -> bytes:
+    # GDSII excess-64 base-16 floating point
+    if v == 0.0:
+        return bytes(8)
+    sign = 0x80 if v < 0.0 else 0x00
+    v = abs(v)
+    exp = 64
+    while v >= 1.0:
+        v /= 16.0
+        exp += 1
+    while v < 1/16:
+        v *= 16.0
+        exp -= 1
+    mant = int(round(v*(1 << 56)))
+    if mant >= (1 << 56):
+        mant >>= 4
+        exp += 1
+    return bytes((sign | exp,)) + mant.to_bytes(7, "big")
+
+
+class _Writer:
+    def __init__(self, f: BinaryIO, *, dbu: float):
+        self._f = f
+        self._scale = 1.0/dbu
+        self._now = time.localtime()[:6]
+
+    def record(self, rectype: int, data: bytes=b"") -> None:
+        self._f.write(struct.pack(">HH", len(data) + 4, rectype))
+        self._f.write(data)
+
+    def int2(self, rectype: int, *vs: int) -> None:
+        self.record(rectype, struct.pack(f">{len(vs)}h", *vs))
+
+    def string(self, rectype: int, s: str) -> None:
+        data = s.encode("ascii")
+        if len(data)%2:
+            data += b"\0"
+        self.record(rectype, data)
+
+    def dbu(self, p: _geo.Point) -> Tuple[int, int]:
+        return (round(p.x*self._scale), round(p.y*self._scale))
+
+    def xy(self, points: Iterable[_geo.Point]) -> None:
+        coords: List[int] = []
+        for p in points:
+            coords.extend(self.dbu(p))
+        self.xydbu(coords)
+
+    def xydbu(self, coords: List[int]) -> None:
+        self.record(_XY, struct.pack(f">{len(coords)}i", *coords))
+
+    def header(self, *, libname: str, dbu: float) -> None:
+        self.int2(_HEADER, 600)
+        self.int2(_BGNLIB, *self._now, *self._now)
+        self.string(_LIBNAME, libname)
+        # user units per database unit, database unit in meter; user unit is µm
+        self.record(_UNITS, _real8(dbu) + _real8(dbu*1e-6))
+
+    def boundary(self, *, layer: int, datatype: int, points: List[_geo.Point]) -> None:
+        if points[0] != points[-1]:
+            points = [*points, points[0]]
+        if len(points) > _maxpoints:
+            raise ValueError(f"Polygon with {len(points)} points is too big for GDSII")
+        self.record(_BOUNDARY)
+        self.int2(_LAYER, layer)
+        self.int2(_DATATYPE, datatype)
+        self.xy(points)
+        self.record(_ENDEL)
+
+    def text(self, *, layer: int, texttype: int, origin: _geo.Point, text: str) -> None:
+        self.record(_TEXT)
+        self.int2(_LAYER, layer)
+        self.int2(_TEXTTYPE, texttype)
+        self.xy((origin,))
+        self.string(_STRING, text)
+        self.record(_ENDEL)
+
+    def strans(self, rotation: _geo.Rotation) -> None:
+        reflect, angle = _strans[rotation]
+        if reflect or angle:
+            self.record(_STRANS, struct.pack(">H", 0x8000 if reflect else 0))
+            if angle:
+                self.record(_ANGLE, _real8(angle))
+
+    def sref(self, *, name: str, origin: Tuple[int, int], rotation: _geo.Rotation) -> None:
+        # origin is in database units
+        self.record(_SREF)
+        self.string(_SNAME, name)
+        self.strans(rotation)
+        self.xydbu(list(origin))
+        self.record(_ENDEL)
+
+    def aref(self, *,
+        name: str, origin: Tuple[int, int], rotation: _geo.Rotation,
+        cols: int, colstep: Tuple[int, int], rows: int, rowstep: Tuple[int, int],
+    ) -> None:
+        # origin and steps are in database units
+        x, y = origin
+        self.record(_AREF)
+        self.string(_SNAME, name)
+        self.strans(rotation)
+        self.int2(_COLROW, cols, rows)
+        self.xydbu([
+            x, y,
+            x + cols*colstep[0], y + cols*colstep[1],
+            x + rows*rowstep[0], y + rows*rowstep[1],
+        ])
+        self.record(_ENDEL)
+
+
+def _runs(vs: List[int]) -> Iterable[Tuple[int, int, int]]:
+    # Split sorted values in runs of equidistant values; yields (start, step, count)
+    i = 0
+    while i < len(vs):
+        if (i + 1 == len(vs)) or (vs[i + 1] == vs[i]):
+            yield (vs[i], 0, 1)
+            i += 1
+            continue
+        step = vs[i + 1] - vs[i]
+        j = i + 1
+        while (
+            (j + 1 < len(vs)) and (vs[j + 1] - vs[j] == step)
+            and (j - i + 1 < _maxcolrow)
+        ):
+            j += 1
+        yield (vs[i], step, j - i + 1)
+        i = j + 1
+
+
+class _Streamer:
+    def __init__(self, writer: _Writer, *,
+        gds_layers: Dict[str, Any], textgds_layers: Dict[str, Any],
+        add_pin_label: bool, release: bool, arrays: bool,
+    ):
+        self._writer = writer
+        self._gds_layers = gds_layers
+        self._textgds_layers = textgds_layers
+        self._add_pin_label = add_pin_label
+        self._release = release
+        self._arrays = arrays
+
+        self._written: Set[str] = set()
+        # For releasing layouts: the cells instantiating a cell in their circuit
+        # that are not written yet and the cells with a layout instantiating it
+        self._subcells: Dict[str, Dict[str, _cell.Cell]] = {}
+        self._pending: Dict[str, Set[str]] = {}
+        self._users: Dict[str, Set[str]] = {}
+        self._unknown: Set[str] = set()
+        # Helper cells for repeated shapes
+        self._repcells: Dict[Tuple[str, _geo.ShapeT], str] = {}
+        self._reppending: List[Tuple[str, str, _geo.ShapeT]] = []
+
+    def _layer(self, name: str, *, text: bool=False):
+        if text and (name in self._textgds_layers):
+            return self._textgds_layers[name]
+        try:
+            return self._gds_layers[name]
+        except KeyError:
+            if name not in self._unknown:
+                warnings.warn(f"No GDS layer for mask '{name}'; shapes not exported")
+                self._unknown.add(name)
+            return None
+
+    def _shape(self, *,
+        cellname: str, maskname: str, shape: _geo.ShapeT, netname: Optional[str],
+    ) -> None:
+        writer = self._writer
+        if self._arrays and isinstance(shape, _geo.RepeatedShape):
+            self._repeated(
+                cellname=cellname, maskname=maskname, shape=shape, netname=netname,
+            )
+            return
+        if isinstance(shape, _geo.Label):
+            layer = self._layer(maskname, text=True)
+            if layer is not None:
+                writer.text(
+                    layer=layer[0], texttype=layer[1], origin=shape.origin,
+                    text=shape.text,
+                )
+            return
+
+        layer = self._layer(maskname)
+        if layer is None:
+            return
+        for ps in shape.pointsshapes:
+            if not isinstance(ps, _geo.Polygon):
+                # Point or Line
+                continue
+            writer.boundary(layer=layer[0], datatype=layer[1], points=list(ps.points))
+        if self._add_pin_label and (netname is not None) and maskname.endswith(".pin"):
+            lbllayer = self._layer(maskname, text=True)
+            assert lbllayer is not None
+            bb = shape.bounds
+            writer.text(
+                layer=lbllayer[0], texttype=lbllayer[1], origin=bb.center,
+                text=netname,
+            )
+
+    def _repeated(self, *,
+        cellname: str, maskname: str, shape: _geo.RepeatedShape, netname: Optional[str],
+    ) -> None:
+        writer = self._writer
+        key = (maskname, shape.shape)
+        try:
+            repname = self._repcells[key]
+        except KeyError:
+            repname = self._repcells[key] = f"{cellname}$rep{len(self._repcells)}"
+            self._reppending.append((repname, maskname, shape.shape))
+        m_dxy = shape.m_dxy if shape.m_dxy is not None else _geo.origin
+        writer.aref(
+            name=repname, origin=writer.dbu(shape.offset0), rotation=_geo.Rotation.No,
+            cols=shape.n, colstep=writer.dbu(shape.n_dxy),
+            rows=shape.m, rowstep=writer.dbu(m_dxy),
+        )
+        if self._add_pin_label and (netname is not None) and maskname.endswith(".pin"):
+            # Label on the first of the repeated shapes
+            lbllayer = self._layer(maskname, text=True)
+            if lbllayer is not None:
+                writer.text(
+                    layer=lbllayer[0], texttype=lbllayer[1],
+                    origin=(shape.shape.bounds.center + shape.offset0), text=netname,
+                )
+
+    def _instances(self, insts: List[_InstanceSubLayout]) -> None:
+        writer = self._writer
+        if not self._arrays:
+            for sl in insts:
+                writer.sref(
+                    name=sl.inst.cell.name, origin=writer.dbu(sl.origin),
+                    rotation=sl.rotation,
+                )
+            return
+
+        # Group instances of same cell and rotation on same y coordinate in rows
+        # of equidistant instances, then group equal rows on equidistant y coordinates
+        # in arrays.
+        def key(sl: _InstanceSubLayout):
+            return (sl.inst.cell.name, sl.rotation.value, writer.dbu(sl.origin)[1])
+        rows: Dict[Tuple[str, str, int, int, int], List[int]] = {}
+        rotations: Dict[str, _geo.Rotation] = {}
+        for (name, rotvalue, y), sls in groupby(sorted(insts, key=key), key=key):
+            sls = tuple(sls)
+            rotations[rotvalue] = sls[0].rotation
+            xs = sorted(writer.dbu(sl.origin)[0] for sl in sls)
+            for x, dx, n in _runs(xs):
+                rows.setdefault((name, rotvalue, x, dx, n), []).append(y)
+        for (name, rotvalue, x, dx, n), ys in rows.items():
+            rotation = rotations[rotvalue]
+            for y, dy, m in _runs(sorted(ys)):
+                if n*m == 1:
+                    writer.sref(name=name, origin=(x, y), rotation=rotation)
+                else:
+                    # Avoid zero vectors for a single row or column
+                    writer.aref(
+                        name=name, origin=(x, y), rotation=rotation,
+                        cols=n, colstep=((dx if n > 1 else 1), 0),
+                        rows=m, rowstep=(0, (dy if m > 1 else 1)),
+                    )
+
+    def count(self, cells: Iterable[_cell.Cell]) -> None:
+        "Derive from the circuits which cells instantiate the cells to be written."
+        todo = list(cells)
+        while todo:
+            cell = todo.pop()
+            if cell.name in self._subcells:
+                continue
+            try:
+                circuit = cell.circuit
+            except (ValueError, NotImplementedError):
+                # No circuit; only instances in the layout are known
+                self._subcells[cell.name] = {}
+                continue
+            subcells = {
+                inst.cell.name: inst.cell
+                for inst in circuit.instances.__iter_type__(_ckt._CellInstance)
+            }
+            self._subcells[cell.name] = subcells
+            for name, subcell in subcells.items():
+                self._pending.setdefault(name, set()).add(cell.name)
+                todo.append(subcell)
+
+    def _release_layout(self, cell: _cell.Cell) -> None:
+        # Release the layout of a written cell generated on demand when no cell
+        # to be written needs it anymore.
+        name = cell.name
+        if (
+            (not isinstance(cell, _cell.OnDemandCell)) or (name not in self._written)
+            or self._pending.get(name) or self._users.get(name)
+            or (name not in cell._layouts.keys())
+        ):
+            return
+        layout = cell._layouts[name].layout
+        del cell._layouts[name]
+        for sl in layout._sublayouts:
+            if isinstance(sl, _InstanceSubLayout):
+                self._users[sl.inst.cell.name].discard(name)
+                self._release_layout(sl.inst.cell)
+
+    def cell(self, cell: _cell.Cell) -> None:
+        "Write a cell and the cells it instantiates that are not written yet."
+        if cell.name in self._written:
+            return
+        self._written.add(cell.name)
+
+        layout = cell.layout
+        insts: List[_InstanceSubLayout] = []
+        for sl in layout._sublayouts:
+            if isinstance(sl, _InstanceSubLayout):
+                insts.append(sl)
+                self._users.setdefault(sl.inst.cell.name, set()).add(cell.name)
+        # Write subcells first, their layout is available now
+        for sl in insts:
+            self.cell(sl.inst.cell)
+
+        writer = self._writer
+        writer.int2(_BGNSTR, *writer._now, *writer._now)
+        writer.string(_STRNAME, cell.name)
+        for sl in layout._sublayouts:
+            if isinstance(sl, _MaskShapesSubLayout):
+                netname = None if sl.net is None else sl.net.name
+                for ms in sl.shapes:
+                    self._shape(
+                        cellname=cell.name, maskname=ms.mask.name, shape=ms.shape,
+                        netname=netname,
+                    )
+        if layout.boundary is not None:
+            self._shape(
+                cellname=cell.name, maskname="prBoundary", shape=layout.boundary,
+                netname=None,
+            )
+        self._instances(insts)
+        writer.record(_ENDSTR)
+
+        # Helper cells may add new helper cells
+        while self._reppending:
+            repname, maskname, shape = self._reppending.pop(0)
+            writer.int2(_BGNSTR, *writer._now, *writer._now)
+            writer.string(_STRNAME, repname)
+            self._shape(cellname=cell.name, maskname=maskname, shape=shape, netname=None)
+            writer.record(_ENDSTR)
+
+        if self._release:
+            for sl in insts:
+                # Drop the placed copy of the subcell layout, computed when needed
+                sl._layout = None
+            del layout, insts
+            for name, subcell in self._subcells.get(cell.name, {}).items():
+                self._pending[name].discard(cell.name)
+                self._release_layout(subcell)
+            self._release_layout(cell)
+
+
+def stream_gds(
+    cells: Union[_lbry.Library, Iterable[_cell.Cell]], file: Union[str, BinaryIO], *,
+    libname: Optional[str]=None, dbu: float=0.001,
+    gds_layers: Optional[Dict[str, Any]]=None, textgds_layers: Optional[Dict[str, Any]]=None,
+    add_pin_label: bool=True, release: bool=False, arrays: bool=True,
+) -> None:
+    """Export cells to a GDSII file cell by cell.
+
+    The cells are written bottom-up together with all the cells they instantiate.
+    For a library all its cells are written, this will generate the cells if the
+    library is generated on demand.
+
+    Arguments:
+        cells: the cells to export; a library exports all its cells
+        file: file name or binary file object to write to
+        libname: the name of the GDS library; default is the name of the library or
+            "LIB" if cells are given.
+        dbu: database unit in µm
+        gds_layers, textgds_layers: the layer map; default the one of the technology
+        add_pin_label: put net name as label on the pin shapes
+        release: release the layouts of the cells generated on demand once they
+            are not needed anymore for the export. A released layout is
+            regenerated when accessed again but without the changes made after its
+            generation, e.g. the labels added to the DC diodes of the IO library,
+            and layouts of cells that are not exported and instantiate it can't be
+            accessed anymore. Only use it when the cells are not used after the
+            export.
+        arrays: write regular repetitions of instances and shapes as arrays
+    """
+    if libname is None:
+        libname = cells.name if isinstance(cells, _lbry.Library) else "LIB"
+    if isinstance(cells, _lbry.Library):
+        cells = cells.cells
+    else:
+        cells = tuple(cells)
+
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            stream_gds(
+                cells, f, libname=libname, dbu=dbu,
+                gds_layers=gds_layers, textgds_layers=textgds_layers,
+                add_pin_label=add_pin_label, release=release, arrays=arrays,
+            )
+        return
+
+    writer = _Writer(file, dbu=dbu)
+    streamer = _Streamer(writer,
+        gds_layers=(_gds_layers if gds_layers is None else gds_layers),
+        textgds_layers=(_textgds_layers if textgds_layers is None else textgds_layers),
+        add_pin_label=add_pin_label, release=release, arrays=arrays,
+    )
+    if release:
+        streamer.count(cells)
+    writer.header(libname=libname, dbu=dbu)
+    for cell in cells:
+        streamer.cell(cell)
+    writer.record(_ENDLIB)
@@ -1,5 +1,6 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
-from typing import Callable, Optional, Any, cast
+import threading
+from typing import Callable, Dict, Optional, Any, cast
 from functools import partial
 
 from pdkmaster.technology import property_ as _prp, geometry as _geo, primitive as _prm
@@ -12,8 +13,11 @@ from c4m.flexio import (
 )
 
 from .pdkmaster import tech, cktfab, layoutfab
+from . import _cache
 from .stdcell import _nmos, _pmos
+from ._library import OnDemandStdCellLibrary
 from ._io_compliance import (
+    dcdiode_actwidth, dcdiode_actspace,
     guardring_create, dcdiode_create, PadIn, PadOut, PadTriOut, PadInOut,
 )
 
@@ -44,12 +48,13 @@ _iostdcellcanvas = _stdfab.StdCellCanvas(
 
 
 # Make own libary for standard cells with prefixed names
-_iostdlib = _lbry.RoutingGaugeLibrary(
-    name="sg13g2_io_stdcells", tech=tech, routinggauge=_iostdcellcanvas.routinggauge
+# The IO cells look up the standard cells they instantiate by name, the library
+# generates them on the first lookup; see `OnDemandStdCellLibrary`.
+_iostdlib = OnDemandStdCellLibrary(
+    name="sg13g2_io_stdcells", tech=tech, canvas=_iostdcellcanvas,
+    fab_class=partial(_IOStdCellFactory, name_prefix="sg13g2_io_"),
 )
-_iostdfab = _IOStdCellFactory(lib=_iostdlib, name_prefix="sg13g2_io_")
-# TODO: change it so .add_default() is not needed
-_iostdfab.add_default()
+_iostdfab = cast(_IOStdCellFactory, _iostdlib.fab)
 
 _cell_width = 80.0
 _cell_height = 180.0
@@ -90,7 +95,8 @@ ihpsg13g2_iospec = IOSpecification(
     capvdd_l=9.5, capvdd_w=9.0, capvdd_fingers=7, capvdd_rows=2,
     rcmosfet_row_minspace=0.25,
     add_corem3pins=True, add_dcdiodes=True,
-    dcdiode_actwidth=1.26, dcdiode_actspace=0.99, dcdiode_actspace_end=1.38,
+    dcdiode_actwidth=dcdiode_actwidth, dcdiode_actspace=dcdiode_actspace,
+    dcdiode_actspace_end=1.38,
     dcdiode_inneractheight=27.78, dcdiode_diodeguard_space=1.32, dcdiode_fingers=2,
     dcdiode_impant_enclosure=0.42,
     dcdiode_indicator=cast(_prm.Auxiliary, _prims["Recog.esd"]),
@@ -117,6 +123,13 @@ ihpsg13g2_ioframespec = IOFrameSpecification(
         TrackSpecification(name="vddvss", bottom=(_cell_height - 41.0), width=40.0),
     ),
 )
+
+
+# Serializes the creation of the factory and the generation of IO cells, so
+# concurrent threads don't generate the same cell twice or see a partial library
+_lock = threading.RLock()
+
+
 class IHPSG13g2IOFactory(IOFactory):
     iospec = ihpsg13g2_iospec
     ioframespec = ihpsg13g2_ioframespec
@@ -173,12 +186,13 @@ class IHPSG13g2IOFactory(IOFactory):
     def get_cell(self, name: str, *,
         create_cb: Optional[Callable[[FactoryCellT], None]]=None,
     ) -> FactoryCellT:
-        if name == "IOPadIn":
-            return self.getcreate_cell(
-                name=name, cell_class=PadIn, create_cb=create_cb,
-            )
-        else:
-            return super().get_cell(name, create_cb=create_cb)
+        with _lock:
+            if name == "IOPadIn":
+                return self.getcreate_cell(
+                    name=name, cell_class=PadIn, create_cb=create_cb,
+                )
+            else:
+                return super().get_cell(name, create_cb=create_cb)
 # iolib is handled by __getattr__()
 
 
@@ -186,20 +200,78 @@ _ihpsg13g2_iofab: Optional[IHPSG13g2IOFactory] = None
 ihpsg13g2_iofab: IHPSG13g2IOFactory
 _iolib: Optional[_lbry.Library] = None
 iolib: _lbry.Library
-def __getattr__(name: str) -> Any:
-    if name in ("ihpsg13g2_iofab", "iolib"):
-        global _ihpsg13g2_iofab, _iolib
-        if _iolib is None:
-            _iolib = _lbry.Library(name="sg13g2_io", tech=tech)
-            _ihpsg13g2_iofab = IHPSG13g2IOFactory(
-                lib=_iolib, cktfab=cktfab, layoutfab=layoutfab, name_prefix="sg13g2_",
-            )
-            _ihpsg13g2_iofab.get_cell("Gallery")
-        if name == "ihpsg13g2_iofab":
-            assert _ihpsg13g2_iofab is not None
-            return _ihpsg13g2_iofab
+_iolib_complete = False
+def _get_iofab() -> IHPSG13g2IOFactory:
+    # Cells are only generated when requested from the factory
+    global _ihpsg13g2_iofab, _iolib
+    if _ihpsg13g2_iofab is None:
+        with _lock:
+            if _ihpsg13g2_iofab is None:
+                _iolib = _lbry.Library(name="sg13g2_io", tech=tech)
+                _ihpsg13g2_iofab = IHPSG13g2IOFactory(
+                    lib=_iolib, cktfab=cktfab, layoutfab=layoutfab,
+                    name_prefix="sg13g2_",
+                )
+    return _ihpsg13g2_iofab
+
+
+def _persistent(fab: IHPSG13g2IOFactory) -> Dict[str, Any]:
+    # Objects that are not pickled when caching or transferring cells
+    return {
+        "lib": fab.lib, "fab": fab,
+        "stdlib": _iostdlib, "stdfab": _iostdfab, "stdcanvas": _iostdcellcanvas,
+        "iospec": ihpsg13g2_iospec, "ioframespec": ihpsg13g2_ioframespec,
+    }
+
+
+def _generate_all(lib: _lbry.Library) -> None:
+    # Generating a cell can add cells to the library; iterating over the cells
+    # also visits the cells added during the iteration.
+    for cell in lib.cells:
+        cell.circuit
+        cell.layout
+    # The order in which the cells are added depends on the order of generation,
+    # e.g. with a pool of processes or with cached cells; sort them so the library,
+    # and the files exported from it, do not.
+    cells = sorted(lib.cells, key=lambda cell: cell.name)
+    lib.cells.clear()
+    lib.cells += cells
+
+
+def _complete_iolib(*, workers: int=1) -> _lbry.Library:
+    global _iolib_complete
+    fab = _get_iofab()
+    lib = fab.lib
+    if _iolib_complete:
+        return lib
+    with _lock:
+        if _iolib_complete:
+            return lib
+        cache_args = dict(
+            name="sg13g2_io", libs=(lib, _iostdlib),
+            sources=("stdcell.py", "io.py", "_io_compliance.py"),
+            persistent=_persistent(fab),
+        )
+        # Cached cells can only be loaded if no cells have been generated yet
+        empty = (len(lib.cells) == 0) and (len(_iostdlib.generated_cells) == 0)
+        if empty and _cache.load(**cache_args):
+            # The standard cells used by the IO cells were loaded
+            _iostdlib.set_complete()
         else:
-            assert name == "iolib"
-            return _iolib
+            if workers > 1:
+                from ._parallel import generate_iocells
+                generate_iocells(fab=fab, workers=workers)
+            fab.get_cell("Gallery")
+            _generate_all(lib)
+            _cache.store(**cache_args)
+        _iolib_complete = True
+    return lib
+
+
+def __getattr__(name: str) -> Any:
+    if name == "ihpsg13g2_iofab":
+        return _get_iofab()
+    elif name == "iolib":
+        return _complete_iolib()
     else:
         raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
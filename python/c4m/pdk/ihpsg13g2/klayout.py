@@ -1,18 +1,256 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
-"""Provide KLayout support"""
-from typing import Optional
+"""KLayout PCell library of the primitives
 
-from pdkmaster.io.klayout import PCellLibrary
+`register_primlib()` is run at KLayout startup so it avoids building the
+technology. The library has the same PCells and cells as the `PCellLibrary` of
+PDKMaster: the names and parameters of the PCells and the shapes of the fixed
+cells are declared from a manifest. The technology and the `PCellLibrary` are
+only built when a PCell is first used; the PCells then delegate to the ones of
+the `PCellLibrary`, so the produced shapes, including the labels, are the same.
+KLayout keeps the produced variants in the layout using them and the primitive
+layouts are memoized in the bounded primitive layout cache, see `_primcache`.
 
-from .pdkmaster import tech, layoutfab, gds_layers
+The manifest is searched in the file given by the `C4M_IHPSG13G2_PCELLMANIFEST`
+environment variable; if not set the `pcells.json` file next to this module is
+used. It is validated against a hash of the technology definition and of the
+versions of the packages used, see `_cache.key()`; this does not import
+PDKMaster. When it is missing or outdated it is derived from the `PCellLibrary`
+and written to that file, or to the library cache directory if the file can't be
+written. The manifest depends on the versions of the installed packages so it is
+not part of the sources; the build of the package generates it with:
 
+    python -m c4m.pdk.ihpsg13g2.klayout [file]
+"""
+import os, sys, json, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any
 
-__all__ = ["register_primlib"]
+try:
+    import pya
+except ImportError:
+    import klayout.db as pya
+
+from . import _cache
+
+
+__all__ = ["register_primlib", "manifest", "write"]
+
+
+_version = 2
+# Packages the PCells depend on next to the ones used for generating cells
+_dists = ("pdkmaster-io-klayout", "klayout")
+# Attributes of the PCell parameter declarations stored in the manifest
+_paramattrs = (
+    "name", "type", "description", "default", "unit", "hidden", "readonly",
+    "tooltip", "min_value", "max_value",
+)
+
+_ManifestT = Dict[str, Any]
+
+
+def _file() -> Optional[Path]:
+    s = os.environ.get("C4M_IHPSG13G2_PCELLMANIFEST")
+    if s is None:
+        return Path(__file__).parent.joinpath("pcells.json")
+    elif not s:
+        return None
+    else:
+        return Path(s)
+
+
+def _cachefile() -> Optional[Path]:
+    return None if _cache._dir is None else _cache._dir.joinpath("pcells.json")
+
+
+def _key() -> str:
+    return _cache.key(name="pcells", sources=("klayout.py",), dists=_dists)
+
+
+# The PCellLibrary of PDKMaster the PCells delegate to; built on first use
+_lock = threading.Lock()
+_implib: Optional["pya.Library"] = None
+
+
+def _get_implib() -> "pya.Library":
+    global _implib
+    if _implib is None:
+        with _lock:
+            if _implib is None:
+                from pdkmaster.io.klayout import PCellLibrary
+                from .pdkmaster import layoutfab, gds_layers
+
+                class _ImplLibrary(PCellLibrary):
+                    # Only used through the library declared from the manifest
+                    def register(self, name: str) -> None:
+                        pass
+
+                _implib = _ImplLibrary(
+                    name="", layoutfab=layoutfab, gds_layers=gds_layers,
+                )
+    return _implib
+
+
+def manifest() -> _ManifestT:
+    "Derive the manifest from the PCellLibrary of PDKMaster"
+    from .pdkmaster import tech
+
+    implib = _get_implib()
+    layout = implib.layout()
+
+    pcells: List[Dict[str, Any]] = []
+    for name in layout.pcell_names():
+        params: List[Dict[str, Any]] = []
+        for decl in layout.pcell_declaration(name).get_parameters():
+            param = {attr: getattr(decl, attr) for attr in _paramattrs}
+            param["choices"] = [
+                [descr, value] for descr, value
+                in zip(decl.choice_descriptions(), decl.choice_values())
+            ]
+            params.append(param)
+        pcells.append({"name": name, "params": params})
+
+    cells: List[Dict[str, Any]] = []
+    for cell in layout.each_cell():
+        if cell.is_pcell_variant():
+            continue
+        if not cell.is_leaf():
+            raise NotImplementedError(f"Cell '{cell.name}' with instances")
+        layers: List[Dict[str, Any]] = []
+        for idx in layout.layer_indexes():
+            polygons: List[str] = []
+            texts: List[str] = []
+            for shape in cell.shapes(idx).each():
+                if shape.is_text():
+                    texts.append(shape.text.to_s())
+                else:
+                    polygons.append(shape.polygon.to_s())
+            if polygons or texts:
+                info = layout.get_info(idx)
+                layers.append({
+                    "layer": [info.layer, info.datatype, info.name],
+                    "polygons": polygons, "texts": texts,
+                })
+        cells.append({"name": cell.name, "layers": layers})
+
+    return {
+        "version": _version, "key": _key(), "tech": tech.name,
+        "description": implib.description, "dbu": layout.dbu,
+        "pcells": pcells, "cells": cells,
+    }
+
+
+def _load(f: Optional[Path], *, key: str) -> Optional[_ManifestT]:
+    if f is None:
+        return None
+    try:
+        m = json.loads(f.read_text())
+    except (OSError, ValueError):
+        return None
+    if (m.get("version") != _version) or (m.get("key") != key):
+        # Outdated manifest
+        return None
+    return m
+
+
+def _store(f: Path, m: _ManifestT) -> None:
+    f.parent.mkdir(parents=True, exist_ok=True)
+    tmp = f.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(m, indent=1))
+    os.replace(tmp, f)
+
+
+def write(file: Optional[str]=None) -> Path:
+    """Write the manifest derived from the PCellLibrary of PDKMaster.
+
+    Arguments:
+        file: the file to write to; if not given the default manifest file.
+    """
+    f = Path(file) if file is not None else _file()
+    if f is None:
+        raise ValueError("PCell manifest disabled and no file given")
+
+    _store(f, manifest())
+
+    return f
+
+
+def _get_manifest() -> _ManifestT:
+    key = _key()
+    for f in (_file(), _cachefile()):
+        m = _load(f, key=key)
+        if m is not None:
+            return m
+
+    m = manifest()
+    for f in (_file(), _cachefile()):
+        if f is None:
+            continue
+        try:
+            _store(f, m)
+        except OSError:
+            continue
+        break
+    return m
+
+
+class _PCell(pya.PCellDeclarationHelper):
+    """PCell declared from the manifest
+
+    All calls are delegated to the PCell with the same name of the PCellLibrary of
+    PDKMaster; the parameters are declared in the same order.
+    """
+    def __init__(self, *, name: str, params: List[Dict[str, Any]]):
+        super().__init__()
+
+        self._name = name
+        for param in params:
+            self.param(
+                param["name"], param["type"], param["description"],
+                hidden=param["hidden"], readonly=param["readonly"], unit=param["unit"],
+                default=param["default"], choices=(param["choices"] or None),
+                min_value=param["min_value"], max_value=param["max_value"],
+                tooltip=param["tooltip"],
+            )
+
+    def _impl(self) -> "pya.PCellDeclaration":
+        return _get_implib().layout().pcell_declaration(self._name)
+
+    def display_text(self, parameters):
+        return self._impl().display_text(parameters)
+
+    def coerce_parameters(self, layout, parameters):
+        return self._impl().coerce_parameters(layout, parameters)
+
+    def callback(self, layout, name, states):
+        self._impl().callback(layout, name, states)
+
+    def produce(self, layout, layers, parameters, cell):
+        self._impl().produce(layout, layers, parameters, cell)
 
 
 def register_primlib(*, name: Optional[str]=None):
+    m = _get_manifest()
     if name is None:
-        name = f"C4M.{tech.name}Prims"
+        name = f"C4M.{m['tech']}Prims"
+
+    lib = pya.Library()
+    lib.description = m["description"]
+    layout = lib.layout()
+    layout.dbu = m["dbu"]
+    for pcell in m["pcells"]:
+        layout.register_pcell(pcell["name"], _PCell(
+            name=pcell["name"], params=pcell["params"],
+        ))
+    for c in m["cells"]:
+        cell = layout.create_cell(c["name"])
+        for spec in c["layers"]:
+            shapes = cell.shapes(layout.layer(pya.LayerInfo(*spec["layer"])))
+            for s in spec["polygons"]:
+                shapes.insert(pya.Polygon.from_s(s))
+            for s in spec["texts"]:
+                shapes.insert(pya.Text.from_s(s))
+    lib.register(name)
+
 
-    # The library will register itself when
-    PCellLibrary(name=name, layoutfab=layoutfab, gds_layers=gds_layers)
\ No newline at end of file
+if __name__ == "__main__":
+    print(write(*sys.argv[1:2]))
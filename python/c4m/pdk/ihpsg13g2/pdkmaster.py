@@ -1,12 +1,14 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
 from typing import Tuple, Dict, cast
 
-from pdkmaster.typing import GDSLayerSpecDict
 from pdkmaster.technology import (
     property_ as _prp, primitive as _prm, technology_ as _tch
 )
 from pdkmaster.design import layout as lay, circuit as ckt
 
+from . import _techsnapshot, _primcache, _grid
+from ._layers import gds_layers, textgds_layers
+
 __all__ = [
     "tech", "technology", "layoutfab", "layout_factory",
     "cktfab", "circuit_factory", "gds_layers", "textgds_layers", #"plotter",
@@ -19,7 +21,7 @@ class _IHPSG13G2(_tch.Technology):
         return "IHPSG13G2"
     @property
     def grid(self):
-        return 0.005
+        return _grid.grid
 
     def __init__(self):
         prims = _prm.Primitives(_prm.Base(type_=_prm.pBase))
@@ -391,32 +393,28 @@ class _IHPSG13G2(_tch.Technology):
 
         super().__init__(primitives=prims)
 
-tech = technology = _IHPSG13G2()
+# Use the precompiled snapshot if it is up-to-date
+_snapshottech = _techsnapshot.load(cls=_IHPSG13G2)
+tech = technology = (
+    _IHPSG13G2() if _snapshottech is None else cast(_IHPSG13G2, _snapshottech)
+)
 cktfab = circuit_factory = ckt.CircuitFactory(tech=tech)
 
 def _primlayout_cb(*, layout: lay.LayoutT, prim: _prm.PrimitiveT, **prim_args):
     from pdkmaster.technology import geometry as _geo
     if isinstance(prim, _prm.Resistor):
-        w = prim_args["width"]
-        l = prim_args["length"]
-        if prim.name == "Rppd":
-            sheet = 396.917
-        elif prim.name == "Rsil":
-            sheet = 24.863
-        else:
+        from .resistor import resistor_models
+        try:
+            model = resistor_models[prim.name]
+        except KeyError:
             raise NotImplementedError(
                 f"resistance computation for Resistor '{prim.name}'",
             )
 
-        r = sheet*l/w
-        if r > 1000.0:
-            r /= 1000.0
-            s = f"{r:.3f}k"
-        else:
-            s = f"{r:.3f}"
+        text, = model.labels(width=prim_args["width"], length=prim_args["length"])
         ms = _geo.MaskShape(
             mask=cast(_prm.DesignMaskPrimitiveT, tech.primitives["TEXT"]).mask,
-            shape=_geo.Label(origin=_geo.origin, text=f"{prim.name.lower()} r={s}"),
+            shape=_geo.Label(origin=_geo.origin, text=text),
         )
         layout.add_shape(shape=ms, net=None)
     elif isinstance(prim, _prm.Diode):
@@ -431,48 +429,7 @@ def _primlayout_cb(*, layout: lay.LayoutT, prim: _prm.PrimitiveT, **prim_args):
             shape=_geo.Label(origin=_geo.origin, text=lbl),
         )
         layout.add_shape(shape=ms, net=None)
-layoutfab = layout_factory = lay.LayoutFactory(tech=tech, create_cb=_primlayout_cb)
-
-gds_layers: GDSLayerSpecDict = {
-    "Recog.esd": (99, 30),
-    "Recog.dio": (99, 31),
-}
-textgds_layers: GDSLayerSpecDict = {}
-
-# Use datatype 100 for obstruction layer;
-# datatype 23 'nofill' would cause no dummy generation if accidently not removed before tape-out
-for name, layer, has_pin, has_obs, has_pintext in (
-    ("Activ", 1, True, True, False),
-    ("GatPoly", 5, True, True, False),
-    ("Cont", 6, False, True, False),
-    ("Metal1", 8, True, True, True),
-    ("Passiv", 9, True, False, False),
-    ("Metal2", 10, True, True, True),
-    ("pSD", 14, False, False, False),
-    ("Via1", 19, False, True, False),
-    ("RES", 24, False, False, False),
-    ("SalBlock", 28, False, False, False),
-    ("Via2", 29, False, True, False),
-    ("Metal3", 30, True, True, True),
-    ("NWell", 31, False, False, False),
-    ("Substrate", 40, False, False, False),
-    ("ThickGateOx", 44, False, False, False),
-    ("Via3", 49, False, True, False),
-    ("Metal4", 50, True, True, True),
-    ("TEXT", 63, False, False, False),
-    ("Via4", 66, False, True, False),
-    ("Metal5", 67, True, True, True),
-    ("EXTBlock", 111, False, False, False),
-    ("TopVia1", 125, False, True, False),
-    ("TopMetal1", 126, True, True, True),
-    ("TopVia2", 133, False, True, False),
-    ("TopMetal2", 134, True, True, True),
-    ("prBoundary", 189, False, False, False),
-):
-    gds_layers[name] = (layer, 0)
-    if has_pin:
-        gds_layers[f"{name}.pin"] = (layer, 2)
-    if has_pintext:
-        textgds_layers[f"{name}.pin"] = (layer, 25)
-    if has_obs:
-        gds_layers[f"{name}.obs"] = (layer, 100)
+# Primitive layouts are cached, see `_primcache`
+layoutfab = layout_factory = _primcache.CachedLayoutFactory(
+    tech=tech, create_cb=_primlayout_cb,
+)
@@ -1,39 +1,76 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
 from pathlib import Path
+from typing import Dict, Tuple, Iterable
 
 from pdkmaster.io.spice import PySpiceFactory
 
-from .spice import prims_spiceparams as _spiceparams
+from . import _spicemodels
+from .spice import prims_spiceparams as _spiceparams, _device_params
 
 
-__all__ = ["pyspicefab"]
+__all__ = ["pyspicefab", "flat_pyspicefab"]
 
 
 _file = Path(__file__)
 _libfile = _file.parent.joinpath("models", "all.spice")
+# Process corners and the corners they can't be combined with
+_corners = (
+    "lvmos_tt", "lvmos_ff", "lvmos_ss", "lvmos_fs", "lvmos_sf",
+    "hvmos_tt", "hvmos_ff", "hvmos_ss", "hvmos_fs", "hvmos_sf",
+    "res_typ", "res_bcs", "res_wcs",
+    "dio",
+)
+_conflicts = {
+    "lvmos_tt": ("lvmos_ff", "lvmos_ss", "lvmos_fs", "lvmos_sf"),
+    "lvmos_ff": ("lvmos_tt", "lvmos_ss", "lvmos_fs", "lvmos_sf"),
+    "lvmos_ss": ("lvmos_tt", "lvmos_ff", "lvmos_fs", "lvmos_sf"),
+    "lvmos_fs": ("lvmos_tt", "lvmos_ff", "lvmos_ss", "lvmos_sf"),
+    "lvmos_sf": ("lvmos_tt", "lvmos_ff", "lvmos_ss", "lvmos_fs"),
+    "hvmos_tt": ("hvmos_ff", "hvmos_ss", "hvmos_fs", "hvmos_sf"),
+    "hvmos_ff": ("hvmos_tt", "hvmos_ss", "hvmos_fs", "hvmos_sf"),
+    "hvmos_ss": ("hvmos_tt", "hvmos_ff", "hvmos_fs", "hvmos_sf"),
+    "hvmos_fs": ("hvmos_tt", "hvmos_ff", "hvmos_ss", "hvmos_sf"),
+    "hvmos_sf": ("hvmos_tt", "hvmos_ff", "hvmos_ss", "hvmos_fs"),
+    "res_typ": ("res_bcs", "res_wcs"),
+    "res_bcs": ("res_typ", "res_wcs"),
+    "res_wcs": ("res_typ", "res_bcs"),
+    "dio": (),
+}
 pyspicefab = PySpiceFactory(
-    libfile=str(_libfile),
-    corners=(
-        "lvmos_tt", "lvmos_ff", "lvmos_ss", "lvmos_fs", "lvmos_sf",
-        "hvmos_tt", "hvmos_ff", "hvmos_ss", "hvmos_fs", "hvmos_sf",
-        "res_typ", "res_bcs", "res_wcs",
-        "dio",
-    ),
-    conflicts={
-        "lvmos_tt": ("lvmos_ff", "lvmos_ss", "lvmos_fs", "lvmos_sf"),
-        "lvmos_ff": ("lvmos_tt", "lvmos_ss", "lvmos_fs", "lvmos_sf"),
-        "lvmos_ss": ("lvmos_tt", "lvmos_ff", "lvmos_fs", "lvmos_sf"),
-        "lvmos_fs": ("lvmos_tt", "lvmos_ff", "lvmos_ss", "lvmos_sf"),
-        "lvmos_sf": ("lvmos_tt", "lvmos_ff", "lvmos_ss", "lvmos_fs"),
-        "hvmos_tt": ("hvmos_ff", "hvmos_ss", "hvmos_fs", "hvmos_sf"),
-        "hvmos_ff": ("hvmos_tt", "hvmos_ss", "hvmos_fs", "hvmos_sf"),
-        "hvmos_ss": ("hvmos_tt", "hvmos_ff", "hvmos_fs", "hvmos_sf"),
-        "hvmos_fs": ("hvmos_tt", "hvmos_ff", "hvmos_ss", "hvmos_sf"),
-        "hvmos_sf": ("hvmos_tt", "hvmos_ff", "hvmos_ss", "hvmos_fs"),
-        "res_typ": ("res_bcs", "res_wcs"),
-        "res_bcs": ("res_typ", "res_wcs"),
-        "res_wcs": ("res_typ", "res_bcs"),
-        "dio": (),
-    },
+    libfile=str(_libfile), corners=_corners, conflicts=_conflicts,
     prims_params=_spiceparams,
 )
+
+
+_models = tuple(params["model"] for _, params in _device_params)
+_flatfabs: Dict[Tuple[str, ...], PySpiceFactory] = {}
+def flat_pyspicefab(*, corner: Iterable[str]) -> PySpiceFactory:
+    """A factory using a flattened model file for a fixed corner combination.
+
+    The model file only contains the models for the given corners that are used by
+    `prims_spiceparams`, without `.lib` or `.include` statements, so it is parsed
+    faster by the simulator. It is cached on disk, see `_spicemodels`.
+    The factory has one corner; use `corner="flat"` for `new_pyspicecircuit()`.
+
+    Arguments:
+        corner: the corner combination, as for `pyspicefab`
+    """
+    corner = tuple(corner)
+    for c in corner:
+        if c not in _corners:
+            raise ValueError(f"Unknown corner '{c}'")
+        for c2 in _conflicts[c]:
+            if c2 in corner:
+                raise ValueError(f"Conflicting corners '{c}' and '{c2}'")
+    # Same file for the same corners in a different order
+    corner = tuple(c for c in _corners if c in corner)
+
+    try:
+        return _flatfabs[corner]
+    except KeyError:
+        libfile = _spicemodels.model_file(corner=corner, models=_models)
+        fab = _flatfabs[corner] = PySpiceFactory(
+            libfile=str(libfile), corners=(_spicemodels.flat_corner,),
+            conflicts={_spicemodels.flat_corner: ()}, prims_params=_spiceparams,
+        )
+        return fab
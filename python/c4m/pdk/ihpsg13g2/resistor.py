@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Resistance of the resistor primitives
+
+The values follow the SPICE models in `models/resistors_mod.lib` and the sheet
+resistances of the corners in `models/cornerRES.lib`: the body has sheet
+resistance over the effective width and length, each end adds a resistance
+inversely proportional to the drawn width. Dimensions are in µm.
+
+All functions take NumPy arrays for the dimensions to compute many resistors in
+one call; for scalar arguments a float is returned.
+"""
+from typing import Dict, Tuple, List, Union
+
+import numpy as _np
+
+
+__all__ = ["ResistorModel", "resistor_models"]
+
+
+ArrayLike = Union[float, _np.ndarray]
+_tnom = 27.0
+
+
+class ResistorModel:
+    """Resistance model of a resistor primitive
+
+    Arguments:
+        prim: the name of the resistor primitive
+        model: the name of the SPICE subcircuit
+        sheetres: the sheet resistance in Ω for each resistor corner
+        dw: difference between effective and drawn width
+        endres: the resistance of one end times the width, in Ω·µm
+        sheet_tc: first and second order temperature coefficient of the body
+        end_tc: first and second order temperature coefficient of the ends
+        kappa, ps: bend parameters of the model
+    """
+    def __init__(self, *,
+        prim: str, model: str, sheetres: Dict[str, float], dw: float, endres: float,
+        sheet_tc: Tuple[float, float], end_tc: Tuple[float, float],
+        kappa: float=1.85, ps: float=0.18,
+    ):
+        self.prim = prim
+        self.model = model
+        self.sheetres = sheetres
+        self.dw = dw
+        self.endres = endres
+        self.sheet_tc = sheet_tc
+        self.end_tc = end_tc
+        self.kappa = kappa
+        self.ps = ps
+
+    def resistance(self, *,
+        width: ArrayLike, length: ArrayLike, bends: ArrayLike=0,
+        corner: str="res_typ", temperature: float=_tnom,
+    ) -> ArrayLike:
+        """The resistance in Ω
+
+        Arguments:
+            width, length: the drawn dimensions
+            bends: the number of bends
+            corner: the resistor corner
+            temperature: the temperature in °C
+        """
+        w = _np.asarray(width, dtype=float)
+        l = _np.asarray(length, dtype=float)
+        b = _np.asarray(bends, dtype=float)
+        weff = w + self.dw
+        leff = (b + 1)*l + (2/self.kappa*weff + self.ps)*b
+
+        dt = temperature - _tnom
+        tc1, tc2 = self.sheet_tc
+        body = self.sheetres[corner]*leff/weff*(1 + tc1*dt + tc2*dt**2)
+        tc1, tc2 = self.end_tc
+        ends = 2*self.endres/w*(1 + tc1*dt + tc2*dt**2)
+
+        r = body + ends
+        return float(r) if r.ndim == 0 else r
+
+    def labels(self, *, width: ArrayLike, length: ArrayLike) -> List[str]:
+        "Layout labels with the typical resistance"
+        rs = _np.atleast_1d(self.resistance(width=width, length=length))
+        return [
+            f"{self.prim.lower()} r={r/1000.0:.3f}k" if r > 1000.0
+            else f"{self.prim.lower()} r={r:.3f}"
+            for r in rs
+        ]
+
+
+resistor_models: Dict[str, ResistorModel] = {
+    "Rsil": ResistorModel(
+        prim="Rsil", model="rsil",
+        sheetres={"res_typ": 7.0, "res_bcs": 6.02, "res_wcs": 7.98},
+        dw=0.01, endres=4.5, sheet_tc=(3100e-6, 0.3e-6), end_tc=(3100e-6, 0.3e-6),
+    ),
+    "Rppd": ResistorModel(
+        prim="Rppd", model="rppd",
+        sheetres={"res_typ": 260.0, "res_bcs": 234.0, "res_wcs": 286.0},
+        dw=0.006, endres=35.0, sheet_tc=(170e-6, 0.4e-6), end_tc=(-950e-6, 0.0),
+    ),
+}
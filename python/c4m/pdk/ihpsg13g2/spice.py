@@ -1,17 +1,25 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import hashlib
+from typing import Dict, List, Tuple, Iterable, Optional
+
+from pdkmaster.design import circuit as _ckt, cell as _cell
 from pdkmaster.io.spice import SpicePrimsParamSpec, SpiceNetlistFactory
 
 from .pdkmaster import tech as _tech
+from .resistor import resistor_models as _resistor_models
 
 
 __all__ = ["prims_spiceparams", "netlistfab"]
 
 
 _prims = _tech.primitives
-prims_spiceparams = SpicePrimsParamSpec()
-for dev_name, params in (
-    ("Rsil", dict(sheetres=7.0, model="rsil", is_subcircuit=True)),
-    ("Rppd", dict(sheetres=260.0, model="rppd", is_subcircuit=True)),
+_device_params = (
+    *(
+        (name, dict(
+            sheetres=model.sheetres["res_typ"], model=model.model, is_subcircuit=True,
+        ))
+        for name, model in _resistor_models.items()
+    ),
     ("ndiode", dict(
         model="dantenna", is_subcircuit=True, subcircuit_paramalias={
             "width": "w", "height": "l",
@@ -27,8 +35,103 @@ for dev_name, params in (
     ("sg13g2_lv_pmos", dict(model="sg13_lv_pmos", is_subcircuit=True)),
     ("sg13g2_hv_nmos", dict(model="sg13_hv_nmos", is_subcircuit=True)),
     ("sg13g2_hv_pmos", dict(model="sg13_hv_pmos", is_subcircuit=True)),
-):
+)
+prims_spiceparams = SpicePrimsParamSpec()
+for dev_name, params in _device_params:
     prims_spiceparams.add_device_params(
         prim=_prims[dev_name], **params, # type: ignore
     )
-netlistfab = SpiceNetlistFactory(params=prims_spiceparams)
+
+
+def _circuit_key(
+    circuit: _ckt.CircuitT, *, params: Optional[SpicePrimsParamSpec]=None,
+) -> str:
+    # Hash of the content of a circuit its SPICE subcircuit depends on;
+    # instantiated cells only contribute the name and the ports of their circuit.
+    # With params the SPICE parameters of the instantiated primitives are included.
+    h = hashlib.sha256()
+    h.update(f"circuit {circuit.name}\n".encode())
+    for port in circuit.ports:
+        h.update(f"port {port.name}\n".encode())
+    for inst in circuit.instances:
+        if isinstance(inst, _ckt.PrimitiveInstanceT):
+            instparams = ",".join(f"{k}={v!r}" for k, v in sorted(inst.params.items()))
+            h.update(f"prim {inst.name} {inst.prim.name} {instparams}\n".encode())
+            if params is not None:
+                spiceparams = params.get(inst.prim, {})
+                h.update(f"spice {sorted(spiceparams.items())!r}\n".encode())
+        else:
+            assert isinstance(inst, _ckt.CellInstanceT)
+            ports = " ".join(port.name for port in inst.ports)
+            h.update(f"cell {inst.name} {inst.circuit.name} {ports}\n".encode())
+    for net in circuit.nets:
+        ports = " ".join(sorted(port.full_name for port in net.childports))
+        h.update(f"net {net.name} {net.external} {ports}\n".encode())
+    return h.hexdigest()
+
+
+def _circuit_hash(circuit: _ckt.CircuitT, *, memo: Dict[int, str]) -> str:
+    # Hash of the content of a circuit, including the content of the circuits of
+    # the instantiated cells
+    try:
+        return memo[id(circuit)]
+    except KeyError:
+        pass
+    h = hashlib.sha256(_circuit_key(circuit).encode())
+    for inst in circuit.instances.__iter_type__(_ckt.CellInstanceT):
+        h.update(_circuit_hash(inst.circuit, memo=memo).encode())
+    digest = memo[id(circuit)] = h.hexdigest()
+    return digest
+
+
+class _MemoSpiceNetlistFactory(SpiceNetlistFactory):
+    """`SpiceNetlistFactory` that memoizes the generated subcircuits.
+
+    Subcircuits are looked up by a hash of the content of the circuit, so a
+    changed circuit is netlisted again. Hashing a circuit does not descend into
+    the instantiated cells as their content is not part of the subcircuit. The
+    SPICE parameters of the primitives are part of the key, so subcircuits are
+    netlisted again after the parameters of the factory are changed.
+    """
+    def __init__(self, *, params: SpicePrimsParamSpec):
+        super().__init__(params=params)
+        self._strs: Dict[Tuple[str, bool], str] = {}
+
+    def export_circuit(self, circuit: _ckt.CircuitT, *, use_semiconres: bool=True) -> str:
+        key = (_circuit_key(circuit, params=self.params), use_semiconres)
+        try:
+            return self._strs[key]
+        except KeyError:
+            s = self._strs[key] = super().export_circuit(
+                circuit, use_semiconres=use_semiconres,
+            )
+            return s
+
+    def deck(self, *, cells: Iterable[_cell.Cell], use_semiconres: bool=True) -> str:
+        """The SPICE subcircuits of cells and of their subcells.
+
+        Each subcircuit is output once, after the subcircuits it instantiates.
+        A `ValueError` is raised when two different circuits have the same name.
+        """
+        names: Dict[str, str] = {}
+        memo: Dict[int, str] = {}
+        strs: List[str] = []
+        for cell in cells:
+            cell.circuit
+            for c in (*cell.subcells_sorted, cell):
+                digest = _circuit_hash(c.circuit, memo=memo)
+                if c.name in names:
+                    if names[c.name] != digest:
+                        raise ValueError(f"Different circuits with name '{c.name}'")
+                    continue
+                names[c.name] = digest
+                strs.append(self.export_circuit(c.circuit, use_semiconres=use_semiconres))
+
+        return "\n".join(strs)
+
+    def clear(self) -> None:
+        "Remove the memoized subcircuits"
+        self._strs.clear()
+
+
+netlistfab = _MemoSpiceNetlistFactory(params=prims_spiceparams)
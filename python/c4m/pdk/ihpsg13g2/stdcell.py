@@ -1,13 +1,15 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
-from typing import Optional, Any, cast
+import threading
+from typing import Dict, Tuple, Optional, Any, cast
 
 from pdkmaster.technology import property_ as _prp, primitive as _prm
 from pdkmaster.design import circuit as _ckt, layout as _lay, library as _lbry
-from pdkmaster.io.klayout import merge
 
 from c4m.flexcell import factory as _fab
 
 from .pdkmaster import tech, cktfab, layoutfab
+from . import _cache
+from ._library import OnDemandStdCellLibrary
 
 __all__ = [
     "stdcellcanvas", "StdCellFactory", "stdcelllib",
@@ -70,26 +72,55 @@ stdcell3v3canvas = _fab.StdCellCanvas(
 # stdcell3v3lib is handled by __getattr__()
 
 
-_stdcelllib: Optional[_lbry.RoutingGaugeLibrary] = None
+def _persistent(lib: OnDemandStdCellLibrary) -> Dict[str, Any]:
+    # Objects that are not pickled when caching or transferring cells
+    canvas, _ = _libspecs[lib.name]
+    return {"lib": lib, "fab": lib.fab, "canvas": canvas}
+
+
+def _create_lib(*, name: str) -> OnDemandStdCellLibrary:
+    canvas, fab_class = _libspecs[name]
+
+    def cache_args(lib: OnDemandStdCellLibrary) -> Dict[str, Any]:
+        return dict(
+            name=name, libs=(lib,), sources=("stdcell.py",), persistent=_persistent(lib),
+        )
+
+    lib = OnDemandStdCellLibrary(
+        name=name, tech=tech, canvas=canvas, fab_class=fab_class,
+        complete_cb=(lambda lib: _cache.store(**cache_args(lib))),
+    )
+    # Without a cache entry the cells will be generated on demand
+    if _cache.load(**cache_args(lib)):
+        lib.set_complete()
+    return lib
+
+
+# Library name to canvas and factory class
+_libspecs: Dict[str, Tuple[_fab.StdCellCanvas, type]] = {
+    "StdCellLib": (stdcellcanvas, StdCellFactory),
+    "StdCell3V3Lib": (stdcell3v3canvas, StdCell3V3Factory),
+}
+# Only one thread creates a library; other threads wait for it
+_lock = threading.RLock()
+_stdcelllib: Optional[OnDemandStdCellLibrary] = None
 stdcelllib: _lbry.RoutingGaugeLibrary
-_stdcell3v3lib: Optional[_lbry.RoutingGaugeLibrary] = None
+_stdcell3v3lib: Optional[OnDemandStdCellLibrary] = None
 stdcell3v3lib: _lbry.RoutingGaugeLibrary
 def __getattr__(name: str) -> Any:
     if name == "stdcelllib":
         global _stdcelllib
         if _stdcelllib is None:
-            _stdcelllib = _lbry.RoutingGaugeLibrary(
-                name="StdCellLib", tech=tech, routinggauge=stdcellcanvas.routinggauge,
-            )
-            StdCellFactory(lib=_stdcelllib).add_default()
+            with _lock:
+                if _stdcelllib is None:
+                    _stdcelllib = _create_lib(name="StdCellLib")
         return _stdcelllib
     elif name == "stdcell3v3lib":
         global _stdcell3v3lib
         if _stdcell3v3lib is None:
-            _stdcell3v3lib = _lbry.RoutingGaugeLibrary(
-                name="StdCell3V3Lib", tech=tech, routinggauge=stdcell3v3canvas.routinggauge,
-            )
-            StdCell3V3Factory(lib=_stdcell3v3lib).add_default()
+            with _lock:
+                if _stdcell3v3lib is None:
+                    _stdcell3v3lib = _create_lib(name="StdCell3V3Lib")
         return _stdcell3v3lib
     else:
         raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
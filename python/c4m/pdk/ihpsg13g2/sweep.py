@@ -0,0 +1,131 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Corner sweeps of simulations
+
+`corner_combinations()` gives the process corner combinations that can be used
+for `pyspicefab`; `corner_sweep()` runs a user provided simulation function for
+corner combinations, temperatures and supply voltages in a pool of worker
+processes and collects the results in a NumPy structured array.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import product
+from typing import Callable, Dict, List, Tuple, Iterable, Optional
+
+import numpy as _np
+
+from . import _parallel
+from .pyspice import _corners, _conflicts
+
+
+__all__ = ["corner_combinations", "corner_sweep"]
+
+
+CornerT = Tuple[str, ...]
+PointT = Tuple[CornerT, float, Optional[float]]
+SimulateT = Callable[..., Dict[str, float]]
+
+
+def corner_combinations(*, include: Iterable[str]=()) -> Tuple[CornerT, ...]:
+    """The valid combinations of process corners.
+
+    A valid combination has no conflicting corners and each corner not in it
+    conflicts with one in it; e.g. one lvmos, one hvmos and one res corner and
+    the dio corner.
+
+    Arguments:
+        include: only return combinations that contain all these corners
+    """
+    include = set(include)
+    for corner in include:
+        if corner not in _corners:
+            raise ValueError(f"Unknown corner '{corner}'")
+
+    combs: List[CornerT] = []
+    def add(i: int, chosen: Tuple[str, ...]) -> None:
+        if i == len(_corners):
+            # All corners not chosen need to conflict with a chosen one
+            if all(
+                any(c2 in _conflicts[c] for c2 in chosen)
+                for c in _corners if c not in chosen
+            ) and include.issubset(chosen):
+                combs.append(chosen)
+            return
+        corner = _corners[i]
+        if not any(c in _conflicts[corner] for c in chosen):
+            add(i + 1, (*chosen, corner))
+        add(i + 1, chosen)
+    add(0, ())
+
+    return tuple(combs)
+
+
+def _simulate(simulate: SimulateT, point: PointT) -> Dict[str, float]:
+    corner, temperature, voltage = point
+    if voltage is None:
+        return simulate(corner=corner, temperature=temperature)
+    else:
+        return simulate(corner=corner, temperature=temperature, voltage=voltage)
+
+
+def corner_sweep(simulate: SimulateT, *,
+    corners: Optional[Iterable[CornerT]]=None,
+    temperatures: Iterable[float]=(25.0,), voltages: Optional[Iterable[float]]=None,
+    workers: Optional[int]=None,
+) -> _np.ndarray:
+    """Run a simulation for all combinations of corners, temperatures and voltages.
+
+    Arguments:
+        simulate: function doing the simulation. It is called with keyword
+            arguments `corner`, the combination of corners to pass to
+            `pyspicefab.new_pyspicecircuit()`, `temperature` and, if voltages are
+            given, `voltage`. It returns a dict with the measured values.
+            With more than one worker it has to be a function that can be
+            pickled, e.g. a module level function.
+        corners: the corner combinations; default all from `corner_combinations()`
+        temperatures: the temperatures in °C
+        voltages: the supply voltages
+        workers: number of worker processes; see `generate_libs()`
+
+    Returns:
+        A structured array with one row per simulation. Fields `corner` (the
+        corners joined with ','), `temperature`, `voltage` (NaN if no voltages
+        given) and one float field for each measured value; NaN if the value was
+        not returned by a simulation.
+    """
+    if corners is None:
+        corners = corner_combinations()
+    points: List[PointT] = list(product(
+        (tuple(corner) for corner in corners), temperatures,
+        ((None,) if voltages is None else voltages),
+    ))
+    workers = _parallel._workers(workers)
+
+    f = partial(_simulate, simulate)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(f, points))
+    else:
+        results = [f(point) for point in points]
+
+    names: List[str] = []
+    for result in results:
+        names.extend(name for name in result.keys() if name not in names)
+    cornerstrs = [",".join(corner) for corner, _, _ in points]
+    dtype = [
+        ("corner", f"U{max((len(s) for s in cornerstrs), default=1)}"),
+        ("temperature", "f8"), ("voltage", "f8"),
+        *((name, "f8") for name in names),
+    ]
+    table = _np.zeros(len(points), dtype=dtype)
+    for name in names:
+        table[name] = _np.nan
+    table["corner"] = cornerstrs
+    table["temperature"] = [temperature for _, temperature, _ in points]
+    table["voltage"] = [
+        _np.nan if voltage is None else voltage for _, _, voltage in points
+    ]
+    for i, result in enumerate(results):
+        for name, value in result.items():
+            table[name][i] = value
+
+    return table
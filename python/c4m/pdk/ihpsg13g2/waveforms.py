@@ -0,0 +1,212 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+"""Simulation results as NumPy arrays
+
+`waveforms()` converts a PySpice analysis in a `Waveforms` object with the node
+voltages and branch currents in one 2-D array; `stack()` combines the results of
+several runs on a common axis in a 3-D array.
+
+The measurement functions work on arrays with time as last dimension and any
+number of leading dimensions, e.g. signals or runs; they return an array with
+the leading dimensions. Values that can't be measured are NaN.
+"""
+from typing import Dict, List, Iterable, Optional, Union, Any
+
+import numpy as _np
+
+
+__all__ = [
+    "Waveforms", "waveforms", "stack",
+    "crossing", "delay", "slew", "energy", "leakage",
+]
+
+
+ArrayLike = Union[float, _np.ndarray]
+
+
+class Waveforms:
+    """Signals of a simulation on a common axis
+
+    Arguments:
+        axis: the time or frequency points
+        names: the names of the signals; node voltages by the node name and
+            branch currents as "i(name)"
+        data: the values of the signals; the last two dimensions are the signals
+            and the axis points, e.g. `(len(names), len(axis))` for one run and
+            `(runs, len(names), len(axis))` for stacked runs.
+    """
+    def __init__(self, *, axis: _np.ndarray, names: Iterable[str], data: _np.ndarray):
+        self.axis = _np.ascontiguousarray(axis, dtype=float)
+        self.names = tuple(names)
+        self.data = _np.ascontiguousarray(data)
+        if self.data.shape[-2:] != (len(self.names), len(self.axis)):
+            raise ValueError("Shape of data does not match names and axis")
+        self._index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+    def __getitem__(self, name: str) -> _np.ndarray:
+        "The values of one signal; leading dimensions are kept"
+        return self.data[..., self._index[name], :]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def select(self, names: Iterable[str]) -> _np.ndarray:
+        "The values of some signals"
+        return self.data[..., [self._index[name] for name in names], :]
+
+
+def waveforms(analysis: Any, *, names: Optional[Iterable[str]]=None) -> Waveforms:
+    """Convert a PySpice analysis.
+
+    Arguments:
+        analysis: a transient, DC sweep or AC analysis
+        names: the signals to convert; default all node voltages and branch
+            currents
+    """
+    for attr in ("time", "frequency", "sweep"):
+        axis = getattr(analysis, attr, None)
+        if axis is not None:
+            break
+    else:
+        raise ValueError("Analysis without time, frequency or sweep axis")
+
+    signals: Dict[str, Any] = {
+        **{str(name).lower(): wave for name, wave in analysis.nodes.items()},
+        **{
+            f"i({str(name).lower()})": wave
+            for name, wave in analysis.branches.items()
+        },
+    }
+    if names is None:
+        names = list(signals.keys())
+    else:
+        names = list(names)
+    waves = [_np.asarray(signals[name]) for name in names]
+    dtype = _np.result_type(float, *waves)
+
+    data = _np.empty((len(names), len(axis)), dtype=dtype)
+    for i, wave in enumerate(waves):
+        data[i] = wave
+    return Waveforms(axis=_np.asarray(axis).real, names=names, data=data)
+
+
+def _interp(x: _np.ndarray, xp: _np.ndarray, fp: _np.ndarray) -> _np.ndarray:
+    # np.interp on the last dimension of fp
+    i = _np.clip(_np.searchsorted(xp, x, side="right") - 1, 0, len(xp) - 2)
+    w = _np.clip((x - xp[i])/(xp[i + 1] - xp[i]), 0.0, 1.0)
+    return fp[..., i]*(1.0 - w) + fp[..., i + 1]*w
+
+
+def stack(wfs: Iterable[Waveforms], *, axis: Optional[_np.ndarray]=None) -> Waveforms:
+    """Combine the results of several runs.
+
+    Arguments:
+        wfs: the results; they need to have the same signals
+        axis: the common axis; default the axis of the first result. Results
+            with another axis are linearly interpolated.
+    """
+    wfs = list(wfs)
+    if not wfs:
+        raise ValueError("No waveforms to stack")
+    names = wfs[0].names
+    if axis is None:
+        axis = wfs[0].axis
+    axis = _np.asarray(axis, dtype=float)
+
+    datas: List[_np.ndarray] = []
+    for wf in wfs:
+        data = wf.select(names)
+        if (len(wf.axis) != len(axis)) or not _np.array_equal(wf.axis, axis):
+            data = _interp(axis, wf.axis, data)
+        datas.append(data)
+    return Waveforms(axis=axis, names=names, data=_np.stack(datas))
+
+
+def _leading(a: ArrayLike) -> _np.ndarray:
+    # Scalar or array with the leading dimensions to broadcast against signals
+    return _np.asarray(a, dtype=float)[..., None]
+
+
+def crossing(t: _np.ndarray, v: _np.ndarray, level: ArrayLike, *,
+    rising: bool=True, after: ArrayLike=-_np.inf,
+) -> _np.ndarray:
+    """The first time a signal crosses a level, linearly interpolated.
+
+    Arguments:
+        t: the time points
+        v: the signals
+        level: the level to cross
+        rising: whether to look for a rising or a falling crossing
+        after: only look for crossings after this time
+    """
+    t = _np.asarray(t, dtype=float)
+    s = _np.asarray(v, dtype=float) - _leading(level)
+    if not rising:
+        s = -s
+    found = (s[..., :-1] < 0.0) & (s[..., 1:] >= 0.0) & (t[1:] > _leading(after))
+    i = found.argmax(axis=-1)[..., None]
+    s0 = _np.take_along_axis(s, i, axis=-1)[..., 0]
+    s1 = _np.take_along_axis(s, i + 1, axis=-1)[..., 0]
+    t0 = t[i[..., 0]]
+    t1 = t[i[..., 0] + 1]
+    with _np.errstate(divide="ignore", invalid="ignore"):
+        tc = t0 + (t1 - t0)*(-s0)/(s1 - s0)
+    return _np.where(found.any(axis=-1), tc, _np.nan)
+
+
+def delay(t: _np.ndarray, vin: _np.ndarray, vout: _np.ndarray, *,
+    vdd: float, in_rising: bool, out_rising: bool, after: ArrayLike=-_np.inf,
+    threshold: float=0.5,
+) -> _np.ndarray:
+    """Delay between the threshold crossings of input and output.
+
+    Arguments:
+        threshold: the crossing level as fraction of vdd
+    """
+    level = threshold*vdd
+    return (
+        crossing(t, vout, level, rising=out_rising, after=after)
+        - crossing(t, vin, level, rising=in_rising, after=after)
+    )
+
+
+def slew(t: _np.ndarray, v: _np.ndarray, *,
+    vdd: float, rising: bool, after: ArrayLike=-_np.inf,
+    low: float=0.2, high: float=0.8,
+) -> _np.ndarray:
+    """Transition time between two levels.
+
+    Arguments:
+        low, high: the levels as fraction of vdd
+    """
+    tlow = crossing(t, v, low*vdd, rising=rising, after=after)
+    thigh = crossing(t, v, high*vdd, rising=rising, after=after)
+    return _np.abs(thigh - tlow)
+
+
+def energy(t: _np.ndarray, i: _np.ndarray, *,
+    v: ArrayLike, start: ArrayLike=-_np.inf, stop: ArrayLike=_np.inf,
+) -> _np.ndarray:
+    """Energy delivered by a supply between two times.
+
+    Arguments:
+        i: the current delivered by the supply
+        v: the supply voltage
+    """
+    t = _np.asarray(t, dtype=float)
+    i = _np.asarray(i, dtype=float)
+    inside = (t >= _leading(start)) & (t <= _leading(stop))
+    segs = (i[..., 1:] + i[..., :-1])*_np.diff(t)/2.0
+    q = _np.sum(_np.where(inside[..., 1:] & inside[..., :-1], segs, 0.0), axis=-1)
+    return _np.asarray(v, dtype=float)*q
+
+
+def leakage(t: _np.ndarray, i: _np.ndarray, *, v: ArrayLike, at: float) -> _np.ndarray:
+    """Static power of a supply at a time the circuit is not switching.
+
+    Arguments:
+        i: the current delivered by the supply
+        v: the supply voltage
+    """
+    t = _np.asarray(t, dtype=float)
+    ia = _interp(_np.asarray([at], dtype=float), t, _np.asarray(i, dtype=float))
+    return _np.asarray(v, dtype=float)*_np.abs(ia[..., 0])
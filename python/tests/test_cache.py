@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import pytest
+
+from c4m.pdk.ihpsg13g2 import _cache, stdcell
+from c4m.pdk.ihpsg13g2.pdkmaster import tech
+
+
+def test_store_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(_cache, "_dir", tmp_path)
+    masks = {mask.name: mask for mask in tech.designmasks}
+
+    # Generating all the cells stores them in the cache
+    lib = stdcell._create_lib(name="StdCellLib")
+    cells = tuple(lib.cells)
+    assert len(tuple(tmp_path.glob("StdCellLib-*.pickle"))) == 1
+
+    lib2 = stdcell._create_lib(name="StdCellLib")
+    assert lib2.complete
+    cells2 = tuple(lib2.cells)
+    assert [cell.name for cell in cells2] == [cell.name for cell in cells]
+    for cell, cell2 in zip(cells, cells2):
+        assert cell2 is not cell
+        ckt, ckt2 = cell.circuit, cell2.circuit
+        assert [net.name for net in ckt2.nets] == [net.name for net in ckt.nets]
+        assert [port.name for port in ckt2.ports] == [port.name for port in ckt.ports]
+        assert set(cell2.layout.polygons) == set(cell.layout.polygons)
+        # Objects of the technology are not copied
+        assert all(
+            masks[ms.mask.name] is ms.mask for ms in cell2.layout.polygons
+        )
+
+
+def test_bad_limit(monkeypatch):
+    monkeypatch.setattr(_cache, "_limit", None)
+    monkeypatch.setenv("C4M_IHPSG13G2_CACHELIMIT", "1G")
+
+    with pytest.warns(UserWarning, match="CACHELIMIT"):
+        assert _cache._get_limit() == 1024*1024*1024
+
+
+def test_bad_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(_cache, "_dir", tmp_path)
+    args = dict(name="Test", sources=(), persistent={})
+
+    # An entry with the wrong number of libraries is a miss and is removed
+    _cache.store(libs=(), **args)
+    assert tuple(tmp_path.glob("Test-*.pickle"))
+    lib = stdcell._create_lib(name="StdCellLib")
+    assert not _cache.load(libs=(lib,), **args)
+    assert not tuple(tmp_path.glob("Test-*.pickle"))
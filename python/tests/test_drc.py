@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import sys, json
+
+import pytest
+
+pytest.importorskip("klayout.db")
+from klayout import db as _kdb, rdb as _krdb
+
+from c4m.pdk.ihpsg13g2 import drc
+
+
+# Stand-in for the klayout executable: reports each shape on layer 1/0 inside
+# the clip box and logs the clip box.
+_fakeklayout = """
+import os, sys, json
+from klayout import db, rdb
+
+args = dict(sys.argv[i + 1].split("=", 1) for i, a in enumerate(sys.argv) if a == "-rd")
+with open(os.environ["C4M_TEST_KLAYOUTLOG"], "a") as f:
+    f.write(json.dumps(args.get("clip")) + "\\n")
+
+layout = db.Layout()
+layout.read(args["input"])
+top = layout.top_cell()
+region = db.Region(top.begin_shapes_rec(layout.layer(1, 0)))
+if "clip" in args:
+    box = db.DBox(*(float(v) for v in args["clip"].split(",")))
+    region = region.interacting(db.Region(box.to_itype(layout.dbu)))
+
+report = rdb.ReportDatabase("fake")
+cell = report.create_cell(top.name)
+cat = report.create_category("shape")
+for polygon in region.each():
+    item = report.create_item(cell.rdb_id(), cat.rdb_id())
+    item.add_value(polygon.bbox().to_dtype(layout.dbu))
+report.save(args["report"])
+"""
+
+
+def _write(gds: str, *, extra: bool) -> None:
+    layout = _kdb.Layout()
+    layout.dbu = 0.001
+    li = layout.layer(1, 0)
+    top = layout.create_cell("top")
+    for i, name in enumerate(("a", "b")):
+        cell = layout.create_cell(name)
+        cell.shapes(li).insert(_kdb.DBox(0.0, 0.0, 1.0, 1.0))
+        if extra and (name == "b"):
+            cell.shapes(li).insert(_kdb.DBox(2.0, 0.0, 3.0, 1.0))
+        top.insert(_kdb.DCellInstArray(cell.cell_index(), _kdb.DTrans(1000.0*i, 0.0)))
+    layout.write(gds)
+
+
+def _items(report: str) -> int:
+    db = _krdb.ReportDatabase("")
+    db.load(report)
+    return db.num_items()
+
+
+def test_halo():
+    # 20% more than the Passiv minimum width of 40.0µm, the largest distance
+    # checked; the 50.0µm wire length condition of the wide TopMetal2 spacing is
+    # not a distance between shapes.
+    assert drc.drc_halo == 48.0
+
+
+def test_incremental(tmp_path, monkeypatch):
+    tech = tmp_path.joinpath("tech")
+    tech.joinpath("drc").mkdir(parents=True)
+    for name in ("DRC.lydrc", "DRC_run.drc"):
+        tech.joinpath("drc", name).write_text("")
+    monkeypatch.setenv("C4M_IHPSG13G2_TECHDIR", str(tech))
+    klayout = tmp_path.joinpath("klayout")
+    klayout.write_text(f"#!{sys.executable}\n{_fakeklayout}")
+    klayout.chmod(0o755)
+    log = tmp_path.joinpath("log")
+    monkeypatch.setenv("C4M_TEST_KLAYOUTLOG", str(log))
+    gds = str(tmp_path.joinpath("chip.gds"))
+    report = str(tmp_path.joinpath("chip.lyrdb"))
+
+    def run():
+        drc.run_drc(gds, report, halo=10.0, klayout=str(klayout))
+
+    _write(gds, extra=False)
+    run()
+    assert _items(report) == 2
+
+    # Only the changed cell is checked again
+    _write(gds, extra=True)
+    run()
+    assert _items(report) == 3
+    clips = [json.loads(line) for line in log.read_text().splitlines()]
+    assert clips[0] is None
+    left, bottom, right, top = (float(v) for v in clips[1].split(","))
+    assert (left, right) == (980.0, 1023.0)
+
+    # Nothing changed
+    run()
+    assert _items(report) == 3
+    assert len(log.read_text().splitlines()) == 2
+
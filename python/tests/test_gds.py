@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import os, sys, json, struct, subprocess
+from io import BytesIO
+
+import pytest
+
+from pdkmaster.design import library as _lbry
+
+from c4m.pdk.ihpsg13g2 import gds, io
+
+
+# Streams the pad cells of the Gallery from a new factory and prints the increase
+# of the peak memory in KiB; the peak is reset before streaming.
+_code = """
+import sys, json
+from pdkmaster.design import library as _lbry
+from c4m.pdk.ihpsg13g2 import gds, io
+
+def hwm():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+
+lib = _lbry.Library(name="sg13g2_io", tech=io.tech)
+fab = io.IHPSG13g2IOFactory(
+    lib=lib, cktfab=io.cktfab, layoutfab=io.layoutfab, name_prefix="sg13g2_",
+)
+cells = [fab.get_cell(name) for name in fab.get_cell("Gallery").cells]
+with open("/proc/self/clear_refs", "w") as f:
+    f.write("5")
+base = hwm()
+gds.stream_gds(cells, sys.argv[1], release=(sys.argv[2] == "1"))
+print(json.dumps(hwm() - base))
+"""
+
+
+def _new_fab() -> io.IHPSG13g2IOFactory:
+    lib = _lbry.Library(name="sg13g2_io", tech=io.tech)
+    return io.IHPSG13g2IOFactory(
+        lib=lib, cktfab=io.cktfab, layoutfab=io.layoutfab, name_prefix="sg13g2_",
+    )
+
+
+def _records(data: bytes):
+    # GDSII records with the dates of the library and the cells zeroed
+    ret = []
+    i = 0
+    while i < len(data):
+        size, rectype = struct.unpack(">HH", data[i:i + 4])
+        rec = data[i + 4:i + size]
+        if rectype in (gds._BGNLIB, gds._BGNSTR):
+            rec = bytes(len(rec))
+        ret.append((rectype, rec))
+        i += size
+    return ret
+
+
+def test_release():
+    names = ("IOPadVss", "IOPadIOVdd")
+
+    fab = _new_fab()
+    cells = [fab.get_cell(name) for name in names]
+    f = BytesIO()
+    gds.stream_gds(cells, f, release=True)
+    for cell in cells:
+        assert cell.name not in cell._layouts.keys()
+
+    reffab = _new_fab()
+    refcells = [reffab.get_cell(name) for name in names]
+    reff = BytesIO()
+    gds.stream_gds(refcells, reff)
+    assert _records(f.getvalue()) == _records(reff.getvalue())
+    for cell in refcells:
+        assert cell.name in cell._layouts.keys()
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/clear_refs"), reason="Peak memory can't be reset",
+)
+def test_memory(tmp_path):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join((
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        *filter(None, (env.get("PYTHONPATH"),)),
+    ))
+
+    peaks = []
+    datas = []
+    for release in ("0", "1"):
+        f = tmp_path.joinpath(f"pads{release}.gds")
+        p = subprocess.run(
+            (sys.executable, "-c", _code, str(f), release),
+            env=env, stdout=subprocess.PIPE, check=True, text=True,
+        )
+        peaks.append(json.loads(p.stdout))
+        datas.append(_records(f.read_bytes()))
+
+    assert datas[1] == datas[0]
+    # Only the layouts of the pad being written and the shared subcells are kept
+    assert peaks[1] < 0.9*peaks[0], peaks
@@ -0,0 +1,44 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import os, sys, subprocess
+
+
+# Cumulative import time in µs of the package as reported by `-X importtime`;
+# building the technology or generating a library takes seconds.
+_budget = 250_000
+# Modules that are only to be imported on first use
+_lazy = ("pdkmaster", "c4m.flexcell", "c4m.flexio", "klayout", "pya", "PySpice")
+
+
+def _importtime(modname: str):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join((
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        *filter(None, (env.get("PYTHONPATH"),)),
+    ))
+    code = (
+        f"import sys, {modname}\n"
+        "print('\\n'.join(sys.modules))\n"
+    )
+    p = subprocess.run(
+        (sys.executable, "-X", "importtime", "-c", code),
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    # Lines are "import time: self [us] | cumulative | imported package"
+    times = {}
+    for line in p.stderr.splitlines():
+        if line.startswith("import time:") and ("|" in line):
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times, p.stdout.split()
+
+
+def test_importtime():
+    times, modules = _importtime("c4m.pdk.ihpsg13g2")
+
+    assert times["c4m.pdk.ihpsg13g2"] < _budget
+    eager = [
+        name for name in modules
+        if any((name == lazy) or name.startswith(f"{lazy}.") for lazy in _lazy)
+    ]
+    assert not eager, f"modules imported eagerly: {eager}"
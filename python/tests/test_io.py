@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+from pdkmaster.technology import geometry as _geo
+from pdkmaster.design import library as _lbry
+
+from c4m.pdk.ihpsg13g2 import _grid, _io_compliance, _parallel, io
+
+
+# Part of the Gallery that is fast to generate
+_names = ("Corner", "Filler200", "IOPadVss", "IOPadIOVdd")
+
+
+def _new_fab() -> io.IHPSG13g2IOFactory:
+    lib = _lbry.Library(name="sg13g2_io", tech=io.tech)
+    return io.IHPSG13g2IOFactory(
+        lib=lib, cktfab=io.cktfab, layoutfab=io.layoutfab, name_prefix="sg13g2_",
+    )
+
+
+def test_parallel():
+    fab = _new_fab()
+    for name in _names:
+        fab.get_cell(name)
+    io._generate_all(fab.lib)
+
+    # Cells are added in another order when generated by the workers
+    fab2 = _new_fab()
+    _parallel.generate_iocells(fab=fab2, workers=2, names=reversed(_names))
+    io._generate_all(fab2.lib)
+
+    cells = tuple(fab.lib.cells)
+    cells2 = tuple(fab2.lib.cells)
+    assert [cell.name for cell in cells2] == [cell.name for cell in cells]
+    for cell, cell2 in zip(cells, cells2):
+        assert [net.name for net in cell2.circuit.nets] == [net.name for net in cell.circuit.nets]
+        assert set(cell2.layout.polygons) == set(cell.layout.polygons)
+
+
+def test_padlabels():
+    fab = _new_fab()
+    layout = fab.get_cell("IOPadIn").layout
+
+    labels = []
+    for sl in layout._sublayouts:
+        for ms in getattr(sl, "shapes", ()):
+            shapes = ms.shape.shapes if isinstance(ms.shape, _geo.MultiShape) else (ms.shape,)
+            labels.extend(
+                (shape.origin.x, shape.origin.y) for shape in shapes
+                if isinstance(shape, _geo.Label) and (shape.text == "PAD")
+            )
+    labels.sort()
+    # The label placement in µm before it was computed in grid units
+    dx = -(1.5*io.ihpsg13g2_iospec.dcdiode_actwidth + io.ihpsg13g2_iospec.dcdiode_actspace)
+    refs = sorted(
+        ((sl.origin.x + dx), sl.origin.y)
+        for sl in _io_compliance._LayoutIndex(layout).instances(*_io_compliance._dcdiodes)
+    )
+    assert len(labels) == len(refs) == 2
+    for (x, y), (refx, refy) in zip(labels, refs):
+        assert (_grid.units(x), _grid.units(y)) == (_grid.units(refx), _grid.units(refy))
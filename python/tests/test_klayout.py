@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import os, sys, json, subprocess
+
+import pytest
+
+pytest.importorskip("pdkmaster.io.klayout")
+
+from c4m.pdk.ihpsg13g2 import klayout as _kl
+
+
+# Registers the library from the manifest and compares it with the PCellLibrary
+# of PDKMaster; prints the result as JSON.
+_code = """
+import sys, json
+from c4m.pdk.ihpsg13g2 import klayout as kl
+pya = kl.pya
+
+kl.register_primlib(name="Test")
+ret = {"pdkmaster": "pdkmaster" in sys.modules}
+lib = pya.Library.library_by_name("Test")
+ret["pcells"] = lib.layout().pcell_names()
+ret["cells"] = [cell.name for cell in lib.layout().each_cell()]
+
+def shapes(layout, cell):
+    return sorted(
+        f"{layout.get_info(idx)} {shape}"
+        for idx in layout.layer_indexes() for shape in cell.shapes(idx).each()
+    )
+
+layout = pya.Layout()
+cell = layout.create_cell("Rppd", "Test", {"_w": 1.0, "_l": 2.0})
+ret["shapes"] = shapes(layout, cell)
+ret["text"] = lib.layout().pcell_declaration("Rppd").display_text([1.0, 2.0])
+
+implayout = kl._get_implib().layout()
+ret["refpcells"] = implayout.pcell_names()
+ret["refcells"] = [cell.name for cell in implayout.each_cell()]
+ret["cellshapes"] = {
+    cell.name: shapes(lib.layout(), cell)
+    for cell in lib.layout().each_cell() if not cell.is_pcell_variant()
+}
+ret["refcellshapes"] = {
+    cell.name: shapes(implayout, cell)
+    for cell in implayout.each_cell() if not cell.is_pcell_variant()
+}
+refcell = implayout.create_cell("Rppd", {"_w": 1.0, "_l": 2.0})
+ret["refshapes"] = shapes(implayout, refcell)
+print(json.dumps(ret))
+"""
+
+
+def test_manifest(tmp_path):
+    f = tmp_path.joinpath("pcells.json")
+    assert _kl.write(str(f)) == f
+
+    env = dict(os.environ)
+    env["C4M_IHPSG13G2_PCELLMANIFEST"] = str(f)
+    env["PYTHONPATH"] = os.pathsep.join((
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        *filter(None, (env.get("PYTHONPATH"),)),
+    ))
+    p = subprocess.run(
+        (sys.executable, "-c", _code),
+        env=env, stdout=subprocess.PIPE, check=True, text=True,
+    )
+    ret = json.loads(p.stdout)
+
+    # Registering from the manifest does not build the technology
+    assert not ret["pdkmaster"]
+    assert ret["pcells"] == ret["refpcells"]
+    assert ret["cells"] == ret["refcells"]
+    assert ret["cellshapes"] == ret["refcellshapes"]
+    # Produced by the PCell of PDKMaster, including the label
+    assert ret["shapes"] == ret["refshapes"]
+    assert any(s.startswith("TEXT") for s in ret["shapes"])
+    assert ret["text"].startswith("Rppd")
+
+
+def test_outdated(tmp_path, monkeypatch):
+    f = tmp_path.joinpath("pcells.json")
+    f.write_text(json.dumps({"version": _kl._version, "key": "outdated"}))
+    monkeypatch.setenv("C4M_IHPSG13G2_PCELLMANIFEST", str(f))
+
+    # An outdated manifest is derived again and stored
+    m = _kl._get_manifest()
+    assert m["key"] == _kl._key()
+    assert json.loads(f.read_text()) == m
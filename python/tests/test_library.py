@@ -0,0 +1,55 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import pytest
+
+from pdkmaster.design import library as _lbry
+
+from c4m.pdk.ihpsg13g2 import _cache, _parallel, stdcell
+
+
+def test_ondemand(monkeypatch):
+    monkeypatch.setattr(_cache, "_dir", None)
+
+    lib = stdcell._create_lib(name="StdCellLib")
+    nand2 = lib.cells["nand2_x1"]
+    assert nand2.name == "nand2_x1"
+    # Only the looked up cell is generated
+    assert [cell.name for cell in lib.generated_cells] == ["nand2_x1"]
+    assert not lib.complete
+    with pytest.raises(KeyError):
+        lib.cells["nand2_x9"]
+
+    reflib = _lbry.RoutingGaugeLibrary(
+        name="StdCellLib", tech=stdcell.tech,
+        routinggauge=stdcell.stdcellcanvas.routinggauge,
+    )
+    stdcell.StdCellFactory(lib=reflib).add_default()
+    assert [cell.name for cell in lib.cells] == [cell.name for cell in reflib.cells]
+    assert lib.complete
+    assert lib.cells["nand2_x1"] is nand2
+
+
+def test_parallel(monkeypatch):
+    monkeypatch.setattr(_cache, "_dir", None)
+
+    lib = stdcell._create_lib(name="StdCellLib")
+    lib.cells["inv_x1"]
+    _parallel.generate_stdcells(lib=lib, workers=2)
+    assert lib.complete
+
+    reflib = stdcell._create_lib(name="StdCellLib")
+    assert [cell.name for cell in lib.cells] == [cell.name for cell in reflib.cells]
+
+
+def test_prewarm(monkeypatch):
+    def generate_libs(name, *, workers):
+        raise RuntimeError(f"failed {name}")
+    monkeypatch.setattr(_parallel, "generate_libs", generate_libs)
+
+    with pytest.warns(UserWarning, match="'iolib'"):
+        futures = _parallel.prewarm("iolib")
+        # The error is raised when joining
+        with pytest.raises(RuntimeError, match="failed iolib"):
+            _parallel.join_prewarm(timeout=10.0)
+    assert futures["iolib"].done()
+    assert not _parallel._prewarm_executors
+    assert not _parallel._prewarm_futures
@@ -0,0 +1,77 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import os, shutil, subprocess
+
+import pytest
+
+pytest.importorskip("klayout.db")
+from klayout import db as _kdb
+
+
+_deck = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, "tech", "lvs", "Extract_deep.lvs",
+)
+_klayout = shutil.which("klayout")
+
+
+def _box(cell, layer, left, bottom, right, top, *, text=None):
+    layout = cell.layout()
+    li = layout.layer(*layer)
+    cell.shapes(li).insert(_kdb.DBox(left, bottom, right, top))
+    if text is not None:
+        cell.shapes(layout.layer(layer[0], 2)).insert(_kdb.DBox(left, bottom, right, top))
+        cell.shapes(layout.layer(layer[0], 2)).insert(
+            _kdb.DText(text, _kdb.DTrans(_kdb.DVector((left + right)/2, (bottom + top)/2))),
+        )
+
+
+def _write(gds: str) -> None:
+    # nmos with source and drain on their own nets and a separate substrate tap,
+    # in a subcell of the top cell
+    layout = _kdb.Layout()
+    layout.dbu = 0.001
+    cell = layout.create_cell("nmos")
+    activ, gatpoly, psd, cont, metal1 = (1, 0), (5, 0), (14, 0), (6, 0), (8, 0)
+
+    _box(cell, activ, 0.0, 0.0, 1.5, 1.0)
+    _box(cell, gatpoly, 0.6, -0.3, 0.9, 1.3)
+    for x, name in ((0.2, "s"), (1.1, "d")):
+        _box(cell, cont, x, 0.4, x + 0.16, 0.56)
+        _box(cell, metal1, x - 0.1, 0.3, x + 0.26, 0.66, text=name)
+    _box(cell, cont, 0.67, 1.42, 0.83, 1.58)
+    _box(cell, gatpoly, 0.6, 1.3, 0.9, 1.7)
+    _box(cell, metal1, 0.57, 1.32, 0.93, 1.68, text="g")
+
+    _box(cell, activ, 3.0, 0.0, 4.0, 1.0)
+    _box(cell, psd, 2.8, -0.2, 4.2, 1.2)
+    _box(cell, cont, 3.42, 0.42, 3.58, 0.58)
+    _box(cell, metal1, 3.3, 0.3, 3.7, 0.7, text="vss")
+
+    top = layout.create_cell("top")
+    top.insert(_kdb.DCellInstArray(cell.cell_index(), _kdb.DTrans()))
+    layout.write(gds)
+
+
+@pytest.mark.skipif(_klayout is None, reason="klayout executable not available")
+def test_deep_nmos(tmp_path):
+    gds = str(tmp_path.joinpath("nmos.gds"))
+    target = str(tmp_path.joinpath("nmos.cir"))
+    _write(gds)
+    subprocess.run(
+        (_klayout, "-b", "-r", _deck, "-rd", f"input={gds}", "-rd", f"target={target}"),
+        check=True,
+    )
+
+    netlist = _kdb.Netlist()
+    netlist.read(target, _kdb.NetlistSpiceReader())
+    # The transistor is extracted in its own cell
+    circuit = netlist.circuit_by_name("NMOS")
+    devices = tuple(circuit.each_device())
+    assert len(devices) == 1
+    nets = {
+        terminal: devices[0].net_for_terminal(terminal).name.lower()
+        for terminal in ("S", "G", "D", "B")
+    }
+    assert {nets["S"], nets["D"]} == {"s", "d"}
+    assert nets["G"] == "g"
+    # The bulk is the substrate, connected to the tap, not to source or drain
+    assert nets["B"] == "vss"
@@ -0,0 +1,44 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import pytest
+
+from pdkmaster.design import layout as _lay
+
+from c4m.pdk.ihpsg13g2 import _primcache
+from c4m.pdk.ihpsg13g2.pdkmaster import tech, cktfab, layoutfab
+
+
+def test_portnets():
+    _primcache.clear()
+    nmos = tech.primitives["sg13g2_lv_nmos"]
+    reffab = _lay.LayoutFactory(tech=tech)
+
+    def layout(name: str, *, fab=layoutfab):
+        ckt = cktfab.new_circuit(name=name)
+        s, g, b = (ckt.new_net(name=name, external=True) for name in ("s", "g", "b"))
+        portnets = {"sourcedrain1": s, "sourcedrain2": s, "gate": g, "bulk": b}
+        nets = {id(s), id(g), id(b)}
+        return fab.layout_primitive(nmos, portnets=portnets, w=1.0), nets
+
+    layout1, nets1 = layout("a")
+    layout2, nets2 = layout("b")
+    assert _primcache.stats()["hits"] == 1
+    ref, _ = layout("ref", fab=reffab)
+    assert set(layout2.polygons) == set(ref.polygons)
+    # Each layout is on the nets of its own circuit
+    for l, nets, other in ((layout1, nets1, nets2), (layout2, nets2, nets1)):
+        found = {id(sl.net) for sl in l._sublayouts if sl.net is not None}
+        assert nets <= found
+        assert found.isdisjoint(other)
+
+    # The cache does not keep the nets of the circuits
+    for cached in _primcache._layouts.values():
+        found = {id(sl.net) for sl in cached._sublayouts if sl.net is not None}
+        assert found.isdisjoint(nets1 | nets2)
+
+
+def test_bad_maxsize(monkeypatch):
+    monkeypatch.setattr(_primcache, "_maxsize", None)
+    monkeypatch.setenv("C4M_IHPSG13G2_PRIMCACHE", "big")
+
+    with pytest.warns(UserWarning, match="PRIMCACHE"):
+        assert _primcache.stats()["maxsize"] == 4096
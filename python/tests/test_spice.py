@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+from pdkmaster.io.spice import SpicePrimsParamSpec, SpiceNetlistFactory
+
+from c4m.pdk.ihpsg13g2 import _cache, stdcell
+from c4m.pdk.ihpsg13g2.pdkmaster import tech
+from c4m.pdk.ihpsg13g2.spice import prims_spiceparams, _MemoSpiceNetlistFactory
+
+
+def test_memo(monkeypatch):
+    monkeypatch.setattr(_cache, "_dir", None)
+
+    lib = stdcell._create_lib(name="StdCellLib")
+    cells = tuple(lib.cells)
+    fab = _MemoSpiceNetlistFactory(params=prims_spiceparams)
+    reffab = SpiceNetlistFactory(params=prims_spiceparams)
+
+    ref = reffab.export_circuits(tuple(cell.circuit for cell in cells))
+    assert fab.deck(cells=cells) == ref
+    # Memoized output
+    assert fab.deck(cells=cells) == ref
+    assert fab.export_library(lib) == reffab.export_library(lib)
+
+    # A changed circuit is netlisted again
+    cell = lib.cells["inv_x1"]
+    cell.circuit.new_net(name="extra", external=True)
+    s = fab.export_circuit(cell.circuit)
+    assert " extra" in s
+    assert s == reffab.export_circuit(cell.circuit)
+
+
+def test_memo_params(monkeypatch):
+    monkeypatch.setattr(_cache, "_dir", None)
+
+    lib = stdcell._create_lib(name="StdCellLib")
+    circuit = lib.cells["inv_x1"].circuit
+    params = SpicePrimsParamSpec()
+    nmos, pmos = (tech.primitives[name] for name in ("sg13g2_lv_nmos", "sg13g2_lv_pmos"))
+    params.add_device_params(prim=nmos, model="sg13_lv_nmos", is_subcircuit=True)
+    params.add_device_params(prim=pmos, model="sg13_lv_pmos", is_subcircuit=True)
+    fab = _MemoSpiceNetlistFactory(params=params)
+    s = fab.export_circuit(circuit)
+    assert "sg13_lv_nmos" in s
+
+    # Changed parameters of the factory are used
+    params.add_device_params(prim=nmos, model="nmos_changed", is_subcircuit=True)
+    s2 = fab.export_circuit(circuit)
+    assert s2 != s
+    assert "nmos_changed" in s2
+    assert s2 == SpiceNetlistFactory(params=params).export_circuit(circuit)
@@ -0,0 +1,47 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later OR GPL-2.0-or-later OR CERN-OHL-S-2.0+ OR Apache-2.0
+import ast
+from pathlib import Path
+
+import pytest
+
+from c4m.pdk.ihpsg13g2 import _techsnapshot, pdkmaster
+from c4m.pdk.ihpsg13g2.pdkmaster import _IHPSG13G2, tech
+
+
+def test_write_load(tmp_path, monkeypatch):
+    f = tmp_path.joinpath("tech.snapshot")
+    monkeypatch.setenv("C4M_IHPSG13G2_TECHSNAPSHOT", str(f))
+    assert _techsnapshot.load(cls=_IHPSG13G2) is None
+
+    assert _techsnapshot.write() == f
+    tech2 = _techsnapshot.load(cls=_IHPSG13G2)
+    assert type(tech2) is _IHPSG13G2
+    assert tech2 is not tech
+    assert [prim.name for prim in tech2.primitives] == [prim.name for prim in tech.primitives]
+    assert [str(rule) for rule in tech2.rules] == [str(rule) for rule in tech.rules]
+
+    # Outdated snapshot
+    f.write_bytes(f.read_bytes().replace(_techsnapshot._magic, b"C4MTECH0", 1))
+    assert _techsnapshot.load(cls=_IHPSG13G2) is None
+
+    # Corrupt snapshot
+    _techsnapshot.write()
+    data = f.read_bytes()
+    f.write_bytes(data[:len(data)//2])
+    with pytest.warns(UserWarning, match="could not be loaded"):
+        assert _techsnapshot.load(cls=_IHPSG13G2) is None
+
+
+def test_sources():
+    # All the modules of the package the technology definition imports
+    src = Path(pdkmaster.__file__).read_text()
+    modules = set()
+    for node in ast.walk(ast.parse(src)):
+        if isinstance(node, ast.ImportFrom) and (node.level == 1):
+            if node.module is not None:
+                modules.add(node.module)
+            else:
+                modules.update(alias.name for alias in node.names)
+    # The layout factory and its callback are not part of the snapshot
+    modules -= {"_primcache", "resistor"}
+    assert {f"{module}.py" for module in modules} <= set(_techsnapshot._sources)